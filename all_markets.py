@@ -1,20 +1,28 @@
 from dash import Dash, dash_table, dcc, html, Input, Output
 import dash
-import pandas as pd
 # A bit of style
 import dash_bootstrap_components as dbc
-from fmp_extractor.news.news import extract_top_news
 
-from aux import get_names_symbols, get_all_quotes, graph_callback_all_history
-
-# List of options for tickers based on the list of available symbols
-names_symbols = get_names_symbols()
-exchanges = names_symbols.exchange.unique()
+from aux import get_names_symbols
+from client_ma import ma_controls, close_data, register_client_ma
+from symbol_search import register_search_callbacks
+from symbols import get_exchanges, get_symbol_index
+from news_feed import get_news, news_table
+from quotes import get_exchange_quotes
+from screener import SCREEN_COLUMNS, screened_quotes, screen_error
+from quote_pipeline import METRICS
+from prefetch import Prefetcher
+from metrics import instrument
+from serialization import compress
+from table_backend import query_frame
 
 # Values to compute the averages of the means
 SHORT_TERM = 30
 LONG_TERM = 200
 
+# WebGL traces in the charts: True, False, or None to switch on above figures.WEBGL_THRESHOLD points
+WEBGL = None
+
 # Order of the columns to show in the table
 order_column = ['name', 'symbol', 'price', 'changesPercentage', 'price_to_yearHighpercent', 'marketCap', 'volume',
                 'voltoavgvolume', 'change', 'dayLow',
@@ -22,148 +30,151 @@ order_column = ['name', 'symbol', 'price', 'changesPercentage', 'price_to_yearHi
                 'priceAvg200', 'exchange', 'open',
                 'previousClose', 'eps', 'pe', 'earningsAnnouncement',
                 'sharesOutstanding', 'timestamp']
+# Metrics registered by analysts are shown after the default columns
+order_column += [m for m in METRICS if m not in order_column]
+# The quotes stay on the server, the table only receives the rows of the page on display
+PAGE_SIZE = 10
+# Milliseconds between two checks for a screen being built in the background
+SCREENER_POLL = 5 * 1000
+
+
+def table_columns(order):
+    return [{"name": i.capitalize(), "id": i, "deletable": True, "selectable": True} for i in order]
+
+
 app = Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
-app.layout = html.Div(className='row', children=[
-    html.Div(children=[
-        html.H4("Market view"),
-        dcc.Dropdown(
-            id='exchange',
-            value='XETRA',
-            clearable=True,
-            options=exchanges
-        ),
-        html.Div(id='table')]),
-    html.Div(className='row', children=[ html.Div(className='row', children=[
-        html.H4("Historical Chart"),
-        dcc.Dropdown(
-            id='name_1',
-            value='Netflix, Inc., NFLX',
-            clearable=True,
-            options=names_symbols.index
-        ),
-        dcc.Graph(id='close_price_1')], style={'display': 'inline-block', 'width': '48%', 'height': '50%'}),
-                                        html.Div(className='row', children=[
-                                            html.H4("Latest News"),
-                                            html.Div(children=html.Div(id='no_news', children=[],
-                                                                       style={'width': '3', 'height': '15'})),
-                                            html.Div(className='row', children=[html.Div(id='news')])],
-                                                 style={'display': 'inline-block', 'width': '48%', 'height': '700'}
-                                                 )]
-             )]
-)
-
-
-@app.callback(Output('table', 'children'), Input('exchange', 'value'))
-def get_quotes_exchange(exch):
-    df = get_all_quotes(exch)
-    df.loc[:, 'price_to_yearHighpercent'] = (df.loc[:, 'price'] /
-                                             df.loc[:, 'yearHigh'] * 100).copy()
-    df['marketCap'] *= 1e-9
-    df['voltoavgvolume'] = df['volume'] / df['avgVolume']
-    return dash_table.DataTable(
-        id='datatable-interactivity',
-        columns=[
-            {"name": i.capitalize(), "id": i, "deletable": True, "selectable": True} for i in df.loc[:, order_column]
-        ],
-        data=df.to_dict('records'),
-        editable=True,
-        filter_action="native",
-        sort_action="native",
-        virtualization=True,
-        sort_mode="multi",
-        column_selectable="single",
-        row_selectable="multi",
-        selected_columns=[],
-        selected_rows=[],
-        page_action="native",
-        page_current=0,
-        page_size=10,
-        style_header={
-            'backgroundColor': 'rgb(30, 30, 30)',
-            'color': 'white',
-        },
-        style_data={
-            'backgroundColor': 'rgb(50, 50, 50)',
-            'color': 'white',
-        },
-        style_table={'minWidth': '100%'},
-        fixed_columns={'headers': True, 'data': 1},
-
-    ),
-
-
-@app.callback(Output('close_price_1', 'figure'), Input('name_1', 'value'))
+# Callback latencies, payload sizes and data stage timings are served at /metrics
+instrument(app)
+# Registered after instrument, so that the compressed sizes are recorded
+compress(app.server)
+
+
+def serve_layout():
+    # Built on each page load, so that the exchanges of a refreshed symbol list are offered
+    return html.Div(className='row', children=[
+        html.Div(children=[
+            html.H4("Market view"),
+            dcc.Dropdown(
+                id='exchange',
+                value='XETRA',
+                clearable=True,
+                options=get_exchanges()
+            ),
+            # Moving averages of every symbol of the exchange, as extra columns to filter and sort on
+            dcc.Checklist(id='screener', options=['Moving average screener'], value=[], inline=True),
+            html.Div(id='screener_status'),
+            dcc.Interval(id='screener_poll', interval=SCREENER_POLL, disabled=True),
+            html.Div(id='table', children=dash_table.DataTable(
+                id='datatable-interactivity',
+                columns=table_columns(order_column),
+                data=[],
+                editable=True,
+                filter_action="custom",
+                filter_query='',
+                sort_action="custom",
+                sort_mode="multi",
+                sort_by=[],
+                column_selectable="single",
+                row_selectable="multi",
+                selected_columns=[],
+                selected_rows=[],
+                page_action="custom",
+                page_current=0,
+                page_size=PAGE_SIZE,
+                style_header={
+                    'backgroundColor': 'rgb(30, 30, 30)',
+                    'color': 'white',
+                },
+                style_data={
+                    'backgroundColor': 'rgb(50, 50, 50)',
+                    'color': 'white',
+                },
+                style_table={'minWidth': '100%'},
+                fixed_columns={'headers': True, 'data': 1},
+            ))]),
+        html.Div(className='row', children=[ html.Div(className='row', children=[
+            html.H4("Historical Chart"),
+            dcc.Dropdown(
+                id='name_1',
+                value='Netflix, Inc., NFLX',
+                clearable=True,
+                options=['Netflix, Inc., NFLX']
+            ),
+            *ma_controls('close_price_1', [SHORT_TERM, LONG_TERM]),
+            dcc.Graph(id='close_price_1')], style={'display': 'inline-block', 'width': '48%', 'height': '50%'}),
+                                            html.Div(className='row', children=[
+                                                html.H4("Latest News"),
+                                                html.Div(children=html.Div(id='no_news', children=[],
+                                                                           style={'width': '3', 'height': '15'})),
+                                                html.Div(className='row', children=[html.Div(id='news')])],
+                                                     style={'display': 'inline-block', 'width': '48%', 'height': '700'}
+                                                     )]
+                 )]
+    )
+
+
+
+app.layout = serve_layout
+
+# Dropdown options are served from the symbol index through search callbacks, instead of being sent with the layout.
+# The symbols are read on each call, so that a refreshed list is picked up.
+register_search_callbacks(app, ['name_1'], get_symbol_index)
+# Moving averages of the history chart are computed in the browser, from closes sent once per ticker
+register_client_ma(app, 'close_price_1')
+
+
+@app.callback(Output('datatable-interactivity', 'data'),
+              Output('datatable-interactivity', 'page_count'),
+              Output('datatable-interactivity', 'columns'),
+              Output('screener_status', 'children'),
+              Output('screener_poll', 'disabled'),
+              Input('exchange', 'value'),
+              Input('screener', 'value'),
+              Input('screener_poll', 'n_intervals'),
+              Input('datatable-interactivity', 'page_current'),
+              Input('datatable-interactivity', 'page_size'),
+              Input('datatable-interactivity', 'sort_by'),
+              Input('datatable-interactivity', 'filter_query'))
+def get_quotes_exchange(exch, screener, n_polls, page_current, page_size, sort_by, filter_query):
+    order = order_column + SCREEN_COLUMNS if screener else order_column
+    # Columns are only reset for a new exchange or mode, so that the ones deleted by the user stay deleted
+    columns = table_columns(order) if dash.ctx.triggered_id in (None, 'exchange', 'screener') else dash.no_update
+    if exch is None:
+        return [], 1, columns, None, True
+    # The screen is computed once for the whole exchange, pages, filters and sorts then reuse it
+    df = screened_quotes(exch, SHORT_TERM, LONG_TERM) if screener else get_exchange_quotes(exch)
+    status, pending = None, screener and df is None
+    if pending:
+        # Quotes are shown until the screen is ready, the table is then refreshed by the poll
+        df = get_exchange_quotes(exch)
+        error = screen_error(exch, SHORT_TERM, LONG_TERM)
+        if error is not None:
+            pending = False
+            status = dbc.Alert(f'The screen of {exch} failed ({error}), it will be tried again later',
+                               color='danger', dismissable=True)
+        else:
+            status = dbc.Alert(f'Screening {exch}, the moving average columns fill in once every history is loaded',
+                               color='info')
+    data, page_count = query_frame(df, page_current, page_size, sort_by, filter_query, columns=order)
+    return data, page_count, columns, status, not pending
+
+
+@app.callback(Output('close_price_1_close', 'data'), Input('name_1', 'value'))
 def price_hist_1(name_1):
-    close_figure = graph_callback_all_history(name_1, names_symbols, freq=None, short_term=SHORT_TERM,
-                                              long_term=LONG_TERM)
-    close_figure.update_layout(height=700, yaxis=dict(autorange=True, fixedrange=False),
-                               xaxis=dict(
-                                   rangeselector=dict(
-                                       buttons=list([
-                                           dict(count=1,
-                                                label="1m",
-                                                step="month",
-                                                stepmode="backward"),
-                                           dict(count=6,
-                                                label="6m",
-                                                step="month",
-                                                stepmode="backward"),
-                                           dict(count=1,
-                                                label="YTD",
-                                                step="year",
-                                                stepmode="todate"),
-                                           dict(count=1,
-                                                label="1y",
-                                                step="year",
-                                                stepmode="backward"),
-                                           dict(count=2,
-                                                label="2y",
-                                                step="year",
-                                                stepmode="backward"),
-                                           dict(count=5,
-                                                label="5y",
-                                                step="year",
-                                                stepmode="backward"),
-                                           dict(step="all")
-                                       ])
-                                   ),
-                                   rangeslider=dict(
-                                       visible=True
-                                   ),
-                                   type="date"
-                               )
-                               )
-    return close_figure
+    return close_data(name_1, get_names_symbols(), chart='history', webgl=WEBGL)
 
 
 @app.callback(Output('news', 'children'),
               Output('no_news', 'children'),
               Input('name_1', 'value'))
 def generate_table(name):
-    ticker = names_symbols.at[name, 'symbol']
-    news = extract_top_news([ticker], limit=50)
-    try:
-        df = pd.DataFrame.from_records(list(news.values())[0]).loc[:, ['publishedDate', 'title', 'text', 'url']]
-    except KeyError:
+    ticker = get_names_symbols().at[name, 'symbol']
+    table = news_table(get_news(ticker, limit=50))
+    if table is None:
         return dash.no_update, dbc.Alert('No news for the selected ticker', color='danger', dismissable=True)
-
-    df['Date'] = df['publishedDate'].str[:11]
-    df['Time'] = df['publishedDate'].str[11:]
-    table = html.Table([
-        html.Thead(
-            html.Tr([html.Th(col) for col in ['Date', 'Time', 'Title']],
-                    style={'white-space': 'nowrap', 'padding': '3px'})
-        ),
-        html.Tbody([
-            html.Tr([
-                html.Td(df.iloc[i]['Date'], style={'white-space': 'nowrap', 'padding': '3px'}),
-                html.Td(df.iloc[i]['Time'], style={'white-space': 'nowrap', 'padding': '3px'}),
-                dcc.Link(html.A(df.iloc[i]['title']), href=df.iloc[i]['url'], target="_blank")
-            ]) for i in range(df.shape[0])])
-    ])
-    return dbc.Table(table, bordered=True, striped=True, responsive=True, color='light',
-                     style={'white-space': 'nowrap', 'border-spacing': '3px'}), dash.no_update
+    return table, dash.no_update
 
 
 if __name__ == '__main__':
+    Prefetcher(symbols=['NFLX'], exchanges=['XETRA']).start()
     app.run_server(debug=True, port=8070)
@@ -1,77 +1,200 @@
-import urllib
-
 import pandas as pd
-import numpy as np
 from fmp_extractor.config import API_KEY
-from fmp_extractor.prices.historic import extract_prices_history, extract_prices_high_frequency
-from fmp_extractor.prices.live import extract_prices_batch
-import plotly.express as px
+import plotly.io as pio
 from functools import partial
 import logging
 
-update = False
-if update is True:
-    LIST_SYMBOLS = pd.read_json(f'https://financialmodelingprep.com/api/v3/available-traded/list?apikey={API_KEY}')
-    LIST_SYMBOLS.to_pickle('list_tradable_symbols.pickle')
-    print('List updated')
-else:
-    LIST_SYMBOLS = pd.read_pickle('list_tradable_symbols.pickle')
+import price_store
+from client import prices_history, prices_high_frequency, prices_batch
+import symbols
+from downsample import downsample_series, MAX_POINTS
+from rolling import rolling_means, rolling_means_frame
+from figures import figure_cache, line_figure
+from resample import close_at, pick_level, gap_breaks
+from stats import access_stats
+from metrics import instrumented
+from batching import fetch_batches, plan_batches, load_batch_size, save_batch_size, safe_batch_size
+
 
+def __getattr__(name):
+    # The symbol universe is loaded on first access, see symbols.py to refresh it
+    if name == 'LIST_SYMBOLS':
+        return symbols.get_list_symbols()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-def get_names_symbols(list_symbols=LIST_SYMBOLS):
+
+def get_names_symbols(list_symbols=None):
+    if list_symbols is None:
+        # Precomputed along with the compact symbol list
+        return symbols.get_names_symbols()
     names_symbols = list_symbols.loc[:, ['name', 'symbol', 'exchange']]
     names_symbols.loc[:, 'name_symbol'] = names_symbols.loc[:, 'name'] + ', ' + names_symbols.loc[:, 'symbol']
     names_symbols.set_index('name_symbol', inplace=True)
     return names_symbols
 
 
-def get_prices(extract_type: str, ticker: str, freq=None):
+# Maximum number of tickers per request of daily histories
+HISTORY_BATCH_SIZE = 5
+
+
+def _fetch_history_batch(tickers, start_date):
+    try:
+        prices = prices_history(tickers, start_date=start_date)
+    except KeyError:
+        return None
+    return prices.loc[prices.symbol.isin(tickers), ['symbol', 'date', 'close']]
+
+
+def _fetch_histories(tickers, start_date):
+    # Large groups of tickers, e.g. a whole exchange, are requested in concurrent batches
+    batches = [tickers[i:i + HISTORY_BATCH_SIZE] for i in range(0, len(tickers), HISTORY_BATCH_SIZE)]
+    frames = [f for f in fetch_batches(batches, lambda batch: _fetch_history_batch(batch, start_date)) if f is not None]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+@instrumented('data')
+def get_prices_many(tickers, days=None):
+    # Histories of several tickers in one round trip, aligned on the union of their dates.
+    # With days, only the days before the latest date of all histories are kept.
+    records = price_store.get_records(list(dict.fromkeys(tickers)), _fetch_histories)
+    return price_store.to_wide_frame(records, days)
+
+
+@instrumented('data')
+def get_bars(ticker: str, freq='1min'):
+    try:
+        prices = prices_high_frequency(ticker, freq=freq)
+    except KeyError:
+        return None
+    prices = prices.set_index(pd.DatetimeIndex(prices['date'])).sort_index()
+    return prices.loc[:, [c for c in ['open', 'high', 'low', 'close', 'volume'] if c in prices]]
+
+
+@instrumented('data')
+def get_prices(extract_type: str, ticker: str, freq=None, level=None):
     if extract_type == 'all':
-        prices = extract_prices_history([ticker], start_date='beginning')
-        return prices.pivot(values='close', columns='symbol', index='date')
+        # Served from the local store, only the bars after the last stored date are requested
+        return price_store.get_history(ticker, _fetch_histories)
     if extract_type == 'high_freq':
-        try:
-            prices =  extract_prices_high_frequency(ticker, freq=freq)
-        except KeyError:
+        bars = get_bars(ticker, freq)
+        if bars is None:
             return None
-        return prices.set_index('date').loc[:, 'close'].to_frame(name=ticker).asfreq(freq)
+        # Bars at freq are aggregated to level, without rows for the periods that have none
+        return close_at(ticker, bars, freq, level or freq)
 
 
-def graph_callback(name, names_symbols, short_term, long_term, extract_type, freq):
+def _build_figure(name, ticker, close, short_term, long_term, extract_type, freq, max_points, x_range, chart,
+                  webgl, template, encode):
+    # Running sums are kept between calls, so only the bars added since the last call are averaged
+    moving_averages = rolling_means.means((ticker, extract_type, freq), close[ticker], [short_term, long_term])
+    series = [('close', close[ticker])] + [(c, moving_averages[c]) for c in moving_averages.columns]
+    # Each trace is downsampled on its own, and keeps the zoom of the chart when rebuilt for a new visible range
+    series = [(c, downsample_series(s, max_points, x_range)) for c, s in series]
+    if extract_type == 'high_freq':
+        series = [(c, gap_breaks(s, freq)) for c, s in series]
+    figure = line_figure(series, chart, uirevision=name, webgl=webgl, template=template, encode=encode)
+    # The level of the bars, which live updates extend the chart with
+    figure['layout']['meta'] = dict(freq=freq)
+    return figure
+
+
+def graph_callback(name, names_symbols, short_term, long_term, extract_type, freq, max_points=MAX_POINTS,
+                   x_range=None, chart='history', webgl=None, template=None, encode=None):
     ticker = names_symbols.at[name, 'symbol']
-    close = get_prices(extract_type, ticker, freq)
+    access_stats.record('symbol', ticker)
+    if extract_type == 'high_freq':
+        bars = get_bars(ticker, freq)
+        if bars is None:
+            return None
+        # The chart shows the coarsest aggregate of the bars that keeps the detail of the visible range
+        level = pick_level(bars.index, freq, x_range, max_points)
+        close = close_at(ticker, bars, freq, level)
+        freq = level
+    else:
+        close = get_prices(extract_type, ticker, freq)
     if close is None:
         return None
-    else:
-        st_close = close.rolling(f'{short_term}d').mean()
-        lt_close = close.rolling(f'{long_term}d').mean()
-        stocks = pd.concat([close[ticker], st_close[ticker], lt_close[ticker]], axis=1,
-                       keys=['close', f'{short_term}d-MA', f'{long_term}d-MA'])
-        close_fig = px.line(stocks, y=stocks.columns, x=stocks.index)
-    return close_fig
+    # The figure only depends on these, and on the data through its length and last bar, whose close changes while
+    # a bar of a coarser level fills up
+    key = (ticker, extract_type, freq, short_term, long_term, max_points, tuple(x_range or ()), chart, webgl,
+           template or pio.templates.default, encode, len(close), close.index[-1] if len(close) else None,
+           close.iat[-1, 0] if len(close) else None)
+    return figure_cache.get_or_set(key, lambda: _build_figure(name, ticker, close, short_term, long_term, extract_type,
+                                                              freq, max_points, x_range, chart, webgl, template,
+                                                              encode))
+
+
+@instrumented('transform')
+def normalized_returns(close):
+    # Percentage change of each ticker since the first date on which all of them have a price, each one relative to
+    # its first close from then on, as a ticker may not trade on that date, e.g. a holiday on its exchange
+    close = close.dropna(axis=1, how='all')
+    if close.empty:
+        return close
+    start = close.apply(lambda c: c.first_valid_index()).max()
+    close = close.loc[start:]
+    return (close / close.bfill().iloc[0] - 1) * 100
+
+
+def compare_callback(names, names_symbols, windows, max_points=MAX_POINTS, chart='history', webgl=None,
+                     template=None):
+    """
+    Returns since a common start date, and their moving averages, of several tickers in one figure. The histories
+    are fetched in one round trip and every statistic is computed for all tickers at once.
+    """
+    names = [n for n in names if n in names_symbols.index]
+    if not names:
+        return None
+    tickers = [names_symbols.at[n, 'symbol'] for n in names]
+    for ticker in tickers:
+        access_stats.record('symbol', ticker)
+    returns = normalized_returns(get_prices_many(tickers))
+    if returns.empty:
+        return None
+    moving_averages = rolling_means_frame(returns, windows)
+    series = [(t, returns[t]) for t in returns.columns]
+    series += [(f'{t} {c}', ma[t]) for c, ma in moving_averages.items() for t in returns.columns]
+    figure = line_figure([(c, downsample_series(s, max_points)) for c, s in series], chart,
+                         uirevision=','.join(tickers), webgl=webgl, template=template)
+    # Moving averages are dotted, and hidden until picked in the legend
+    for trace in figure['data'][len(returns.columns):len(series)]:
+        trace.update(line=dict(dash='dot'), visible='legendonly')
+    figure['layout']['yaxis'] = dict(figure['layout']['yaxis'], title=dict(text='return (%)'))
+    return figure
 
 
 graph_callback_all_history = partial(graph_callback, extract_type='all')
 graph_callback_high_freq = partial(graph_callback, extract_type='high_freq')
 
+# Quotes endpoint used by prices_batch, only its length matters to plan the batches
+QUOTE_URL = 'https://financialmodelingprep.com/api/v3/quote/{symbols}?apikey={api_key}'
+QUOTE_URL_BYTES = len(QUOTE_URL.format(symbols='', api_key=API_KEY))
+BATCH_SIZE = 1500
+
+
+def quote_batches(exchange: str):
+    list_symbols = symbols.get_list_symbols()
+    tickers_to_extract = list_symbols.loc[list_symbols.exchange == exchange, 'symbol'].to_numpy()
+    batch_size = load_batch_size(exchange, default=BATCH_SIZE)
+    # Batches are packed by the length of the resulting URL, rather than split evenly
+    return plan_batches(tickers_to_extract, base_bytes=QUOTE_URL_BYTES, max_batch_size=batch_size)
 
-def get_all_quotes(exchange: str):
-    tickers_to_extract = LIST_SYMBOLS.loc[LIST_SYMBOLS.exchange == exchange, 'symbol'].values
-    len_exchange = len(tickers_to_extract)
-    batch_size = 1500
-    # Using np.vectorize here does not work quite efficiently, since the splits are ragged
-    n_batches = int(np.ceil(len_exchange / batch_size))
-    print(f'Getting {exchange} with {len_exchange} tickers with {n_batches} request(s) of maximum size {batch_size}')
-    while True:
-        try:
-            arrays = np.array_split(tickers_to_extract, n_batches)
-            frame = [extract_prices_batch(t) for t in arrays]
-            break
-        except urllib.error.HTTPError:
-            logging.warning('Resulting HTML request is too long')
-            n_batches += 1
-            logging.warning(f'Increasing the size of the batches to {n_batches}')
 
+@instrumented('data')
+def get_all_quotes(exchange: str, fetch=prices_batch, process=None):
+    batches = quote_batches(exchange)
+    print(f'Getting {exchange} with {sum(len(b) for b in batches)} tickers with {len(batches)} request(s) of maximum '
+          f'size {max((len(b) for b in batches), default=0)}')
+    stats = {}
+    if process is not None:
+        # Each batch is processed as soon as it arrives, rather than once they are all put together
+        fetch = (lambda f: lambda tickers: process(f(tickers)))(fetch)
+    # The batches are requested concurrently and reassembled in their original order
+    frame = fetch_batches(batches, fetch, stats=stats)
+    new_batch_size = safe_batch_size(stats)
+    if new_batch_size is not None:
+        logging.warning(f'Remembering a batch size of {new_batch_size} for {exchange}')
+        save_batch_size(exchange, new_batch_size)
     return pd.concat(frame)
 
 
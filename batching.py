@@ -0,0 +1,124 @@
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximum number of batch requests in flight at the same time
+MAX_IN_FLIGHT = 8
+RETRIES = 3
+# Seconds to wait before the first retry, doubled on each subsequent one
+BACKOFF = 0.5
+# HTTP codes worth retrying, other HTTP errors are returned to the caller straight away
+RETRY_CODES = (429, 500, 502, 503, 504)
+# HTTP codes of a request line or headers too long, the batch is split rather than failed
+SPLIT_CODES = (400, 414, 431)
+# Longest URL sent upstream, most servers reject request lines above 8KB
+MAX_URL_BYTES = 8000
+# Largest batch size known to succeed for each exchange, kept between runs
+BATCH_SIZES_FILE = 'batch_sizes.json'
+
+
+def _is_transient(error):
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in RETRY_CODES
+    return isinstance(error, (urllib.error.URLError, ConnectionError, TimeoutError))
+
+
+def fetch_with_retries(fetch, batch, retries=RETRIES, backoff=BACKOFF):
+    for attempt in range(retries + 1):
+        try:
+            return fetch(batch)
+        except Exception as error:
+            if attempt == retries or not _is_transient(error):
+                raise
+            wait = backoff * 2 ** attempt
+            logging.warning(f'Batch of {len(batch)} tickers failed with {error!r}, retrying in {wait}s')
+            time.sleep(wait)
+
+
+def plan_batches(symbols, base_bytes: int, max_url_bytes=MAX_URL_BYTES, max_batch_size=None):
+    """
+    Split symbols into consecutive batches whose comma separated, percent encoded list fits in
+    max_url_bytes - base_bytes, with at most max_batch_size symbols each.
+    """
+    batches = []
+    start, url_bytes = 0, base_bytes
+    for i, symbol in enumerate(symbols):
+        cost = len(urllib.parse.quote(str(symbol), safe='')) + (i > start)
+        if i > start and (url_bytes + cost > max_url_bytes or i - start == max_batch_size):
+            batches.append(symbols[start:i])
+            start, url_bytes = i, base_bytes
+            cost -= 1
+        url_bytes += cost
+    if len(symbols) > start:
+        batches.append(symbols[start:])
+    return batches
+
+
+def _fetch_splitting(fetch, batch, retries, backoff, stats):
+    try:
+        frame = fetch_with_retries(fetch, batch, retries, backoff)
+    except urllib.error.HTTPError as error:
+        if error.code not in SPLIT_CODES or len(batch) == 1:
+            raise
+        # The request is too long, only this batch is split and the others are kept
+        logging.warning(f'Batch of {len(batch)} tickers rejected with {error!r}, splitting it in two')
+        stats['failed'].append(len(batch))
+        half = len(batch) // 2
+        return (_fetch_splitting(fetch, batch[:half], retries, backoff, stats) +
+                _fetch_splitting(fetch, batch[half:], retries, backoff, stats))
+    stats['succeeded'].append(len(batch))
+    return [frame]
+
+
+def fetch_batches(batches, fetch, max_in_flight=MAX_IN_FLIGHT, retries=RETRIES, backoff=BACKOFF, stats=None):
+    """
+    Call fetch on every batch using at most max_in_flight threads, and return the results in the order of batches.
+    Rejected batches are split in halves and fetched again, the sizes that succeeded and failed are added to stats.
+    The first error that survives the retries is raised once the batches already running have finished.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('succeeded', [])
+    stats.setdefault('failed', [])
+    if len(batches) <= 1 or max_in_flight <= 1:
+        return [frame for b in batches for frame in _fetch_splitting(fetch, b, retries, backoff, stats)]
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(batches))) as executor:
+        futures = [executor.submit(_fetch_splitting, fetch, b, retries, backoff, stats) for b in batches]
+        try:
+            return [frame for f in futures for frame in f.result()]
+        except Exception:
+            for f in futures:
+                f.cancel()
+            raise
+
+
+def _load_batch_sizes(path=BATCH_SIZES_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_batch_size(exchange: str, default: int, path=BATCH_SIZES_FILE):
+    return _load_batch_sizes(path).get(exchange, default)
+
+
+def save_batch_size(exchange: str, batch_size: int, path=BATCH_SIZES_FILE):
+    sizes = _load_batch_sizes(path)
+    sizes[exchange] = batch_size
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(sizes, f)
+    os.replace(tmp_path, path)
+
+
+def safe_batch_size(stats):
+    # Largest size that went through, below the smallest one that was rejected
+    if not stats['failed'] or not stats['succeeded']:
+        return None
+    return min(max(stats['succeeded']), min(stats['failed']) - 1)
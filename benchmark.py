@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import fake_provider
+
+# Exchange sizes, in number of symbols, and years of daily history benchmarked
+EXCHANGE_SIZES = [1000, 10000, 50000]
+HISTORY_YEARS = [1, 20]
+INTRADAY_DAYS = 20
+REPEAT = 5
+BASELINE = 'benchmark_baseline.json'
+# Rows of the DataTable page and of the news panel
+PAGE_SIZE = 50
+NEWS_LIMIT = 50
+SHORT_TERM = 30
+LONG_TERM = 200
+
+
+def measure(func, repeat: int):
+    # Timings of repeat runs, then the peak of memory allocated by one more run
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'median_s': statistics.median(times), 'min_s': min(times), 'peak_mb': peak / 2 ** 20}
+
+
+def benchmarks(provider):
+    """
+    Yield (name, function) pairs exercising the hot paths of the apps against provider. The apps' modules are
+    imported here, once the fake provider is installed and the working directory set up.
+    """
+    import aux
+    import cache
+    import rolling
+    from dash._utils import to_json
+    from news_feed import fetch_news, news_table
+    from quote_pipeline import process_batch, finish
+    from table_backend import query_frame
+    from client import client, TokenBucket
+    from client_ma import close_data
+
+    # The provider's rate limit would dominate the timings, the benchmarks measure the apps
+    client.bucket = TokenBucket(rate=1e9, capacity=1e9)
+
+    def cold():
+        # Figures and moving averages are rebuilt, as for a ticker that was not displayed yet
+        aux.figure_cache = cache.SnapshotCache('benchmark', ttl=0, max_entries=1)
+        aux.rolling_means = rolling.RollingMeans()
+
+    for size in EXCHANGE_SIZES:
+        exchange = f'EX{size}'
+        yield f'quotes_{size}', lambda exchange=exchange: finish(aux.get_all_quotes(exchange, process=process_batch))
+
+        quotes = finish(aux.get_all_quotes(exchange, process=process_batch))
+        yield f'table_{size}', lambda quotes=quotes: to_json(query_frame(
+            quotes, 0, PAGE_SIZE, sort_by=[{'column_id': 'marketCap', 'direction': 'desc'}],
+            filter_query='{price} > 50'))
+
+    names_symbols = aux.get_names_symbols(fake_provider.listing({'HIST': 1}))
+    name = names_symbols.index[0]
+    for years in HISTORY_YEARS:
+        provider.history_years = years
+        # Histories are stored locally after the first call, the benchmark covers the figure
+        aux.price_store.save(names_symbols.iloc[0]['symbol'], aux.price_store.to_records(
+            provider.extract_prices_history([names_symbols.iloc[0]['symbol']]).loc[:, ['date', 'close']]))
+
+        # The history charts get the closes, their moving averages are computed in the browser
+        def graph():
+            return to_json(close_data(name, names_symbols))
+        graph()
+        yield f'graph_{years}y', graph
+
+    def intraday():
+        cold()
+        return to_json(aux.graph_callback_high_freq(name, names_symbols, freq='1min', short_term=SHORT_TERM,
+                                                    long_term=LONG_TERM, chart='intraday'))
+    yield f'graph_1min_{INTRADAY_DAYS}d', intraday
+
+    records = fetch_news(['HIS00000'], limit=NEWS_LIMIT)['HIS00000']
+    yield 'news_table', lambda: to_json(news_table(records))
+
+
+def payloads(provider):
+    """
+    Yield (name, build) pairs, build() returning the output of a callback as the apps send it. Figures are built
+    again on each call, so that they follow figures.ENCODE_ARRAYS.
+    """
+    import aux
+    import cache
+    from quotes import enriched_quotes
+    from table_backend import query_frame
+    from news_feed import fetch_news, news_table
+    from client import client, TokenBucket
+    from client_ma import close_data
+
+    client.bucket = TokenBucket(rate=1e9, capacity=1e9)
+    quotes = enriched_quotes(f'EX{EXCHANGE_SIZES[-1]}')
+    yield 'table_page', lambda: query_frame(quotes, 0, PAGE_SIZE, sort_by=[{'column_id': 'marketCap',
+                                                                            'direction': 'desc'}])[0]
+
+    names_symbols = aux.get_names_symbols(fake_provider.listing({'HIST': 1}))
+    name, ticker = names_symbols.index[0], names_symbols.iloc[0]['symbol']
+    provider.history_years = HISTORY_YEARS[-1]
+    aux.price_store.save(ticker, aux.price_store.to_records(
+        provider.extract_prices_history([ticker]).loc[:, ['date', 'close']]))
+
+    def figure(**kwargs):
+        aux.figure_cache = cache.SnapshotCache('benchmark', ttl=0, max_entries=1)
+        return aux.graph_callback(name, names_symbols, short_term=SHORT_TERM, long_term=LONG_TERM, webgl=False,
+                                  **kwargs)
+    yield f'graph_{HISTORY_YEARS[-1]}y', lambda: close_data(name, names_symbols)
+    yield f'graph_1min_{INTRADAY_DAYS}d', lambda: figure(extract_type='high_freq', freq='1min', chart='intraday')
+
+    records = fetch_news([ticker], limit=NEWS_LIMIT)[ticker]
+    yield 'news_table', lambda: news_table(records)
+
+
+def payload_report(provider, repeat: int):
+    # Size and encoding time of the callback outputs, as plain JSON lists with the json engine (before), and as
+    # typed arrays with the fastest engine available (after), each also compressed
+    import figures
+    import plotly.io as pio
+    from dash._utils import to_json
+    from serialization import encode_body, brotli
+
+    def encode(output, engine):
+        pio.json.config.default_engine = engine
+        start = time.perf_counter()
+        for _ in range(repeat):
+            body = to_json(output).encode()
+        return body, (time.perf_counter() - start) / repeat
+
+    fast_engine = pio.json.config.default_engine
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    print(f'{"payload":<20}{"before (kB)":>12}{"ms":>8}{"after (kB)":>12}{"ms":>8}'
+          + ''.join(f'{e + " (kB)":>12}' for e in encodings))
+    for name, build in payloads(provider):
+        figures.ENCODE_ARRAYS = False
+        before, before_time = encode(build(), 'json')
+        figures.ENCODE_ARRAYS = True
+        after, after_time = encode(build(), fast_engine)
+        print(f'{name:<20}{len(before) / 1e3:>12.1f}{before_time * 1e3:>8.2f}{len(after) / 1e3:>12.1f}'
+              f'{after_time * 1e3:>8.2f}' + ''.join(f'{len(encode_body(after, e)) / 1e3:>12.1f}' for e in encodings))
+
+
+def compare(results, baseline):
+    print(f'{"benchmark":<24}{"median (s)":>12}{"baseline":>12}{"ratio":>8}{"peak (MB)":>12}{"baseline":>12}')
+    for name, result in results.items():
+        base = baseline.get(name)
+        ratio = f'{result["median_s"] / base["median_s"]:.2f}' if base else '-'
+        print(f'{name:<24}{result["median_s"]:>12.4f}{base["median_s"] if base else float("nan"):>12.4f}{ratio:>8}'
+              f'{result["peak_mb"]:>12.1f}{base["peak_mb"] if base else float("nan"):>12.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the apps against a fake provider')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--only', help='Only run the benchmarks whose name contains this')
+    parser.add_argument('--save', action='store_true', help='Save the results as the baseline')
+    parser.add_argument('--baseline', default=BASELINE, help='Baseline file to compare with, or to save to')
+    parser.add_argument('--payloads', action='store_true', help='Compare the payload sizes and encoding times instead')
+    args = parser.parse_args()
+    baseline_path = os.path.abspath(args.baseline)
+
+    provider = fake_provider.FakeProvider(intraday_days=INTRADAY_DAYS)
+    fake_provider.install(provider)
+    # Price store, caches and symbol list of the benchmark live in a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix='benchmark_'))
+    fake_provider.listing({f'EX{size}': size for size in EXCHANGE_SIZES}).to_pickle('list_tradable_symbols.pickle')
+    if args.payloads:
+        payload_report(provider, args.repeat)
+        return
+
+    results = {}
+    for name, func in benchmarks(provider):
+        if args.only is None or args.only in name:
+            results[name] = measure(func, args.repeat)
+            print(f'{name:<24}{results[name]["median_s"]:.4f} s, peak {results[name]["peak_mb"]:.1f} MB', flush=True)
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            compare(results, json.load(f)['results'])
+    if args.save:
+        with open(baseline_path, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f,
+                      indent=2)
+        print(f'Saved the baseline to {baseline_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+import fcntl
+import hashlib
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# When set, caches are stored in this directory and shared by every worker process on the host
+CACHE_DIR = os.environ.get('DASH_CACHE_DIR')
+# Lock files of a file cache, keys share them by hash so that their number stays fixed whatever the keys
+LOCK_STRIPES = 64
+
+
+class MemoryBackend:
+    # Process-wide backend, the least recently used entries are dropped beyond max_entries
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+            return item
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @contextmanager
+    def lock(self, key):
+        # Per key locks are counted, and dropped once nobody holds or waits for them
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            key_lock[1] += 1
+        try:
+            with key_lock[0]:
+                yield
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+
+
+class FileBackend:
+    # Pickle file per entry. The file mtime tracks the last access and drives the LRU eviction,
+    # while flock on one of LOCK_STRIPES side files deduplicates the computations across processes.
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key, suffix='.pickle'):
+        if isinstance(key, str) and len(key) < 100:
+            name = key.replace(os.sep, '_')
+        else:
+            # Keys that do not make a file name, such as tuples, are hashed
+            name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, name + suffix)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                item = pickle.load(f)
+            os.utime(path)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        return item
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((time.time(), value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                   if name.endswith('.pickle')]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def lock(self, key):
+        # A stable hash, the stripe of a key must be the same in every process
+        stripe = zlib.crc32(repr(key).encode()) % LOCK_STRIPES
+        with open(os.path.join(self.directory, f'stripe_{stripe}.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SnapshotCache:
+    def __init__(self, name: str, ttl: float, max_entries: int, cache_dir=CACHE_DIR):
+        self.ttl = ttl
+        if cache_dir:
+            self.backend = FileBackend(os.path.join(cache_dir, name), max_entries)
+        else:
+            self.backend = MemoryBackend(max_entries)
+
+    def _fresh(self, item):
+        return item is not None and time.time() - item[0] < self.ttl
+
+    def get(self, key):
+        item = self.backend.get(key)
+        return item[1] if self._fresh(item) else None
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def get_or_set(self, key, compute):
+        """
+        Return the cached value for key, calling compute() when it is missing or older than the TTL.
+        Concurrent callers asking for the same key wait for a single computation.
+        """
+        item = self.backend.get(key)
+        if self._fresh(item):
+            return item[1]
+        with self.backend.lock(key):
+            # The entry may have been filled while waiting for the lock
+            item = self.backend.get(key)
+            if self._fresh(item):
+                return item[1]
+            value = compute()
+            self.backend.set(key, value)
+            return value
@@ -0,0 +1,120 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from fmp_extractor.news.news import extract_top_news
+from fmp_extractor.prices.historic import extract_prices_history, extract_prices_high_frequency
+from fmp_extractor.prices.live import extract_prices_batch
+
+from metrics import timed
+
+# Sustained number of upstream requests per second, and how many can be sent at once after a quiet period
+RATE = 5
+BURST = 10
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Block until a token is available, and return the number of seconds spent waiting
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - start
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _freeze(value):
+    # Hashable version of the call arguments, arrays of tickers included
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class ProviderClient:
+    # Single entry point to the data provider: calls are rate limited by a token bucket shared by all callbacks,
+    # and a call identical to one already in flight waits for its result instead of being sent again.
+    def __init__(self, rate=RATE, burst=BURST):
+        self.bucket = TokenBucket(rate, burst)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'coalesced': 0, 'errors': 0, 'queue_depth': 0, 'max_queue_depth': 0,
+                         'wait_time': 0.0, 'max_wait_time': 0.0}
+
+    def _count(self, **increments):
+        with self._lock:
+            for name, increment in increments.items():
+                self.counters[name] += increment
+            self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], self.counters['queue_depth'])
+
+    def call(self, func, *args, **kwargs):
+        key = (func, _freeze(args), _freeze(kwargs))
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+        if not leader:
+            self._count(coalesced=1)
+            return future.result()
+
+        try:
+            self._count(queue_depth=1)
+            try:
+                wait = self.bucket.acquire()
+            finally:
+                self._count(queue_depth=-1)
+            with self._lock:
+                self.counters['wait_time'] += wait
+                self.counters['max_wait_time'] = max(self.counters['max_wait_time'], wait)
+            self._count(requests=1)
+            with timed('network', func.__name__):
+                result = func(*args, **kwargs)
+        except Exception as error:
+            self._count(errors=1)
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+client = ProviderClient()
+
+
+def prices_history(tickers, start_date='beginning'):
+    return client.call(extract_prices_history, list(tickers), start_date=start_date)
+
+
+def prices_high_frequency(ticker: str, freq='1min'):
+    return client.call(extract_prices_high_frequency, ticker, freq=freq)
+
+
+def prices_batch(tickers):
+    return client.call(extract_prices_batch, tickers)
+
+
+def top_news(tickers, limit: int):
+    return client.call(extract_top_news, list(tickers), limit=limit)
@@ -0,0 +1,184 @@
+from dash import dcc, html, Input, Output
+
+import figures
+from aux import get_prices
+from downsample import MAX_POINTS
+from figures import chart_layout, WEBGL_THRESHOLD, SLIDER_POINTS
+from serialization import compact_dates, typed_array
+from stats import access_stats
+
+# Windows, in days, that can be picked for the moving averages of a chart
+WINDOW_OPTIONS = [5, 10, 15, 20, 30, 50, 100, 150, 200]
+
+# Values of the Store, as sent by serialization.typed_array
+DECODE_JS = """
+function decode(values) {
+    if (Array.isArray(values)) {
+        return values;
+    }
+    const binary = atob(values.bdata);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new Float64Array(bytes.buffer);
+}
+"""
+
+# Builds the figure from the stored closes: time based moving averages over (t - w days, t], as on the server,
+# computed with a running sum in one pass per window. As figures.line_figure does, each trace is then min-max reduced
+# to max_points, with the full budget in the visible range, and drawn with WebGL above webgl_threshold points.
+FIGURE_JS = """
+function(data, windows, relayout) {
+    if (!data) {
+        return window.dash_clientside.no_update;
+    }
+""" + DECODE_JS + """
+    function minmax(y, start, end, nOut) {
+        // Positions of the first, last, lowest and highest points of each of nOut / 2 buckets of y[start:end]
+        const n = end - start;
+        const idx = [];
+        if (n <= nOut || nOut < 4) {
+            for (let i = start; i < end; i++) { idx.push(i); }
+            return idx;
+        }
+        const size = Math.ceil(n / Math.floor(nOut / 2));
+        idx.push(start, end - 1);
+        for (let b = start; b < end; b += size) {
+            let low = b, high = b;
+            for (let i = b; i < Math.min(b + size, end); i++) {
+                if (isNaN(y[i])) { continue; }
+                if (isNaN(y[low]) || y[i] < y[low]) { low = i; }
+                if (isNaN(y[high]) || y[i] > y[high]) { high = i; }
+            }
+            idx.push(low, high);
+        }
+        return Array.from(new Set(idx)).sort((a, b) => a - b);
+    }
+    function trace(name, idx, x, y, webgl) {
+        return {type: webgl ? 'scattergl' : 'scatter', mode: 'lines', name: name, x: idx.map(i => x[i]),
+                y: Float64Array.from(idx, i => y[i]), legendgroup: name, showlegend: true,
+                hovertemplate: 'variable=' + name + '<br>date=%{x}<br>value=%{y}<extra></extra>'};
+    }
+    const options = data.options;
+    const x = data.x;
+    const y = decode(data.y);
+    const t = x.map(Date.parse);
+    const series = [['close', y]];
+    (windows || []).slice().sort((a, b) => a - b).forEach(function(days) {
+        const width = days * 864e5;
+        const means = new Float64Array(y.length);
+        let start = 0, sum = 0, count = 0;
+        for (let i = 0; i < y.length; i++) {
+            if (!isNaN(y[i])) { sum += y[i]; count++; }
+            while (t[i] - t[start] >= width) {
+                if (!isNaN(y[start])) { sum -= y[start]; count--; }
+                start++;
+            }
+            means[i] = count ? sum / count : NaN;
+        }
+        series.push([days + 'd-MA', means]);
+    });
+
+    // The visible range gets the budget, unless a new ticker was loaded, which starts from its whole history
+    const ctx = window.dash_clientside.callback_context;
+    const newTicker = ctx.triggered.some(trigger => trigger.prop_id.endsWith('.data'));
+    const range = !newTicker && relayout && !relayout['xaxis.autorange'] && (relayout['xaxis.range'] ||
+        (relayout['xaxis.range[0]'] !== undefined ? [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']] : null));
+    let start = 0, end = t.length;
+    if (range) {
+        const low = Date.parse(range[0]), high = Date.parse(range[1]);
+        while (start < t.length && t[start] < low) { start++; }
+        end = start;
+        while (end < t.length && t[end] <= high) { end++; }
+    }
+    const outline = Math.max(Math.floor(options.max_points / 10), 4);
+    const reduced = series.map(([name, values]) => [name, range ?
+        minmax(values, 0, start, outline).concat(minmax(values, start, end, options.max_points),
+                                                 minmax(values, end, values.length, outline)) :
+        minmax(values, 0, values.length, options.max_points), values]);
+    const points = reduced.reduce((total, [name, idx]) => total + idx.length, 0);
+    const webgl = options.webgl === null ? points > options.webgl_threshold : options.webgl;
+    const traces = reduced.map(([name, idx, values]) => trace(name, idx, x, values, webgl));
+    const layout = Object.assign({}, data.layout);
+    const finite = Array.from(y).filter(v => !isNaN(v));
+    if (webgl && finite.length) {
+        // WebGL traces are not drawn in the range slider, an SVG outline of the close on a hidden axis stands in
+        const idx = minmax(y, 0, y.length, options.slider_points);
+        traces.push({type: 'scatter', mode: 'lines', x: idx.map(i => x[i]), y: Float64Array.from(idx, i => y[i]),
+                     yaxis: 'y2', showlegend: false, hoverinfo: 'skip', line: {width: 1}});
+        const low = Math.min(...finite), high = Math.max(...finite), span = (high - low) || 1;
+        layout.yaxis2 = {overlaying: 'y', visible: false, fixedrange: true, range: [low - 3 * span, low - 2 * span]};
+        layout.xaxis = Object.assign({}, layout.xaxis, {rangeslider: {visible: true, yaxis2: {rangemode: 'auto'}}});
+    }
+    return {data: traces, layout: layout};
+}
+"""
+
+# Change, low and high of the close over the visible range of the chart
+STATS_JS = """
+function(relayout, data) {
+    if (!data) {
+        return '';
+    }
+""" + DECODE_JS + """
+    const y = decode(data.y);
+    const t = data.x.map(Date.parse);
+    let start = 0, end = t.length - 1;
+    const range = relayout && (relayout['xaxis.range'] ||
+        (relayout['xaxis.range[0]'] !== undefined ? [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']] : null));
+    if (range && !relayout['xaxis.autorange']) {
+        const low = Date.parse(range[0]), high = Date.parse(range[1]);
+        while (start < t.length && t[start] < low) { start++; }
+        while (end >= 0 && t[end] > high) { end--; }
+    }
+    if (start > end) {
+        return '';
+    }
+    const visible = Array.from(y.slice(start, end + 1)).filter(v => !isNaN(v));
+    if (!visible.length) {
+        return '';
+    }
+    const change = (visible[visible.length - 1] / visible[0] - 1) * 100;
+    return data.x[start] + ' to ' + data.x[end] + ': ' + change.toFixed(2) + '%, low ' +
+        Math.min(...visible).toFixed(2) + ', high ' + Math.max(...visible).toFixed(2);
+}
+"""
+
+
+def ma_controls(graph_id: str, windows):
+    # Window picker, stored closes and visible range statistics of a chart, to be placed around the graph
+    return [dcc.Dropdown(id=f'{graph_id}_windows', options=WINDOW_OPTIONS, value=list(windows), multi=True,
+                         placeholder='Moving averages (days)'),
+            dcc.Store(id=f'{graph_id}_close'),
+            html.Div(id=f'{graph_id}_stats')]
+
+
+def close_data(name, names_symbols, chart='history', template=None, max_points=MAX_POINTS, webgl=None):
+    """
+    Daily closes of the ticker and the layout of its chart, sent once per ticker to the chart's Store. The moving
+    averages, statistics and the reduction to max_points per trace are then computed in the browser. With webgl=None,
+    WebGL traces are used above figures.WEBGL_THRESHOLD points, as for the figures built on the server.
+    """
+    if name not in names_symbols.index:
+        return None
+    ticker = names_symbols.at[name, 'symbol']
+    access_stats.record('symbol', ticker)
+    close = get_prices('all', ticker)
+    if close is None:
+        return None
+    close = close[ticker].dropna()
+    options = dict(max_points=max_points, webgl=webgl, webgl_threshold=WEBGL_THRESHOLD, slider_points=SLIDER_POINTS)
+    if not figures.ENCODE_ARRAYS:
+        return dict(x=close.index.values, y=close.values, layout=chart_layout(chart, template, uirevision=name),
+                    options=options)
+    return dict(x=compact_dates(close.index.values), y=typed_array(close.values),
+                layout=chart_layout(chart, template, uirevision=name), options=options)
+
+
+def register_client_ma(app, graph_id: str):
+    app.clientside_callback(FIGURE_JS, Output(graph_id, 'figure'),
+                            Input(f'{graph_id}_close', 'data'), Input(f'{graph_id}_windows', 'value'),
+                            Input(graph_id, 'relayoutData'))
+    app.clientside_callback(STATS_JS, Output(f'{graph_id}_stats', 'children'),
+                            Input(graph_id, 'relayoutData'), Input(f'{graph_id}_close', 'data'))
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from dash import ctx
+
+# Maximum number of points sent per trace, about two per horizontal pixel of a chart
+MAX_POINTS = 2000
+
+
+def minmax_indices(y, n_out: int):
+    """
+    Positions of the points to keep so that at most n_out points remain: the series is cut into n_out / 2 buckets
+    and the minimum and maximum of each bucket are kept, as well as the first and last points.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return np.arange(n)
+    bucket_size = int(np.ceil(n / (n_out // 2)))
+    n_buckets = int(np.ceil(n / bucket_size))
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, bucket_size)
+    # NaN gaps are neither a minimum nor a maximum, unless the whole bucket is empty
+    lows = np.where(np.isnan(buckets), np.inf, buckets).argmin(axis=1)
+    highs = np.where(np.isnan(buckets), -np.inf, buckets).argmax(axis=1)
+    offsets = np.arange(n_buckets) * bucket_size
+    idx = np.concatenate([[0, n - 1], offsets + lows, offsets + highs])
+    return np.unique(idx[idx < n])
+
+
+def downsample_series(series, n_out=MAX_POINTS, x_range=None):
+    """
+    Reduce series to about n_out points. When x_range is given, the points in that range get the full budget
+    and the rest of the series a coarse outline, so that zoomed views keep their detail.
+    """
+    if x_range is None:
+        return series.iloc[minmax_indices(series.values, n_out)]
+    start = series.index.searchsorted(pd.Timestamp(x_range[0]))
+    end = series.index.searchsorted(pd.Timestamp(x_range[1]), 'right')
+    outline = max(n_out // 10, 4)
+    parts = [series.iloc[:start], series.iloc[start:end], series.iloc[end:]]
+    budgets = [outline, n_out, outline]
+    return pd.concat([p.iloc[minmax_indices(p.values, b)] for p, b in zip(parts, budgets)])
+
+
+def visible_range(relayout_data):
+    # The x range of a chart, as reported by its relayoutData after a zoom or pan
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range' in relayout_data:
+        return relayout_data['xaxis.range'][:2]
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+    return None
+
+
+def zoomed_range(graph_id: str, relayout_data):
+    # Only a zoom or pan on the chart itself sets the range, a new ticker starts from its whole history
+    if ctx.triggered_id != graph_id:
+        return None
+    return visible_range(relayout_data)
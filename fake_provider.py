@@ -0,0 +1,112 @@
+import sys
+import time
+import types
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Last date of the synthetic histories, fixed so that every run sees the same data
+END_DATE = '2024-06-28'
+TRADING_MINUTES = 390
+
+
+def _rng(*keys):
+    # Same data for the same arguments, from one run to the next
+    return np.random.default_rng(zlib.crc32(repr(keys).encode()))
+
+
+def _walk(rng, n: int, start=100.):
+    return start * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+class FakeProvider:
+    """
+    Deterministic, local stand-in for the fmp_extractor endpoints used by the apps, for benchmarks. Daily histories
+    span history_years up to END_DATE, intraday series have intraday_days of 1-minute bars, and each call sleeps
+    latency seconds to mimic the network.
+    """
+    def __init__(self, history_years=20, intraday_days=20, latency=0.):
+        self.history_years = history_years
+        self.intraday_days = intraday_days
+        self.latency = latency
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def extract_prices_history(self, tickers, start_date='beginning'):
+        self._call()
+        dates = pd.bdate_range(end=END_DATE, periods=self.history_years * 261)
+        frames = []
+        for ticker in tickers:
+            close = _walk(_rng('history', ticker, self.history_years), len(dates))
+            frame = pd.DataFrame({'symbol': ticker, 'date': dates.strftime('%Y-%m-%d'), 'close': close})
+            if start_date != 'beginning':
+                frame = frame.loc[dates >= pd.Timestamp(start_date)]
+            # Most recent first, as returned by the API
+            frames.append(frame.iloc[::-1])
+        return pd.concat(frames, ignore_index=True)
+
+    def extract_prices_high_frequency(self, ticker, freq='1min'):
+        self._call()
+        days = pd.bdate_range(end=END_DATE, periods=self.intraday_days)
+        dates = (days.values[:, None] + pd.Timedelta(hours=9, minutes=30).to_timedelta64()
+                 + np.arange(TRADING_MINUTES) * np.timedelta64(1, 'm')).ravel()
+        close = _walk(_rng('intraday', ticker, self.intraday_days), len(dates))
+        return pd.DataFrame({'date': dates[::-1], 'open': close[::-1], 'close': close[::-1]})
+
+    def extract_prices_batch(self, tickers):
+        self._call()
+        tickers = list(tickers)
+        n = len(tickers)
+        rng = _rng('quotes', tickers[0] if tickers else '', n)
+        price = rng.uniform(1, 500, n)
+        return pd.DataFrame({
+            'symbol': tickers, 'name': [f'{t} Inc.' for t in tickers], 'price': price,
+            'changesPercentage': rng.normal(0, 2, n), 'change': rng.normal(0, 1, n),
+            'dayLow': price * 0.98, 'dayHigh': price * 1.02, 'yearHigh': price * rng.uniform(1, 2, n),
+            'yearLow': price * rng.uniform(0.5, 1, n), 'marketCap': rng.uniform(1e7, 1e12, n),
+            'priceAvg50': price * rng.uniform(0.9, 1.1, n), 'priceAvg200': price * rng.uniform(0.8, 1.2, n),
+            'exchange': 'BENCH', 'volume': rng.integers(1e3, 1e7, n), 'avgVolume': rng.integers(1e3, 1e7, n),
+            'open': price * rng.uniform(0.98, 1.02, n), 'previousClose': price * rng.uniform(0.98, 1.02, n),
+            'eps': rng.normal(2, 1, n), 'pe': rng.uniform(5, 50, n),
+            'earningsAnnouncement': '2024-07-25T20:00:00.000+0000', 'sharesOutstanding': rng.integers(1e6, 1e10, n),
+            'timestamp': 1719590400})
+
+    def extract_top_news(self, tickers, limit=50):
+        self._call()
+        tickers = list(tickers)
+        dates = pd.date_range(end=f'{END_DATE} 16:00', periods=limit, freq='17min')[::-1].strftime('%Y-%m-%d %H:%M:%S')
+        return {'news': [{'symbol': tickers[i % len(tickers)], 'publishedDate': date,
+                          'title': f'{tickers[i % len(tickers)]} headline {i}', 'text': 'Lorem ipsum ' * 20,
+                          'url': f'https://news.example.com/{tickers[i % len(tickers)]}/{i}'}
+                         for i, date in enumerate(dates)]}
+
+
+def listing(exchange_sizes):
+    # List of tradable symbols with as many symbols on each exchange as given by exchange_sizes
+    frames = []
+    for exchange, size in exchange_sizes.items():
+        tickers = [f'{exchange[:3]}{i:05d}' for i in range(size)]
+        frames.append(pd.DataFrame({'symbol': tickers, 'name': [f'{t} Inc.' for t in tickers], 'price': 100.,
+                                    'exchange': exchange, 'exchangeShortName': exchange, 'type': 'stock'}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def install(provider: FakeProvider):
+    """
+    Register modules named like the fmp_extractor ones, backed by provider, so that the apps' modules imported
+    afterwards call the fake provider. Only meant for benchmark processes.
+    """
+    modules = {name: types.ModuleType(name) for name in
+               ['fmp_extractor', 'fmp_extractor.config', 'fmp_extractor.prices', 'fmp_extractor.prices.historic',
+                'fmp_extractor.prices.live', 'fmp_extractor.news', 'fmp_extractor.news.news']}
+    modules['fmp_extractor.config'].API_KEY = 'benchmark'
+    modules['fmp_extractor.prices.historic'].extract_prices_history = provider.extract_prices_history
+    modules['fmp_extractor.prices.historic'].extract_prices_high_frequency = provider.extract_prices_high_frequency
+    modules['fmp_extractor.prices.live'].extract_prices_batch = provider.extract_prices_batch
+    modules['fmp_extractor.news.news'].extract_top_news = provider.extract_top_news
+    sys.modules.update(modules)
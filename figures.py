@@ -0,0 +1,107 @@
+from functools import lru_cache
+
+import numpy as np
+import plotly.io as pio
+
+from cache import SnapshotCache
+from downsample import minmax_indices
+from metrics import instrumented
+from serialization import encode_trace
+
+# Built figures are reused while the data they were built from is unchanged
+FIGURE_TTL = 60 * 60
+FIGURE_CACHE_SIZE = 256
+figure_cache = SnapshotCache('figures', ttl=FIGURE_TTL, max_entries=FIGURE_CACHE_SIZE)
+# Above this number of points in a figure, traces are drawn with WebGL instead of SVG
+WEBGL_THRESHOLD = 5000
+# WebGL traces are not drawn in the range slider, an SVG outline of the first trace with this many points stands in
+SLIDER_POINTS = 500
+# Values are sent as base64 typed arrays and dates with their coarsest precision, False sends plain lists.
+# Charts extended in the browser with extendData or a Patch pass encode=False, plotly cannot append to typed arrays.
+ENCODE_ARRAYS = True
+
+HISTORY_BUTTONS = [dict(count=1, label="1m", step="month", stepmode="backward"),
+                   dict(count=6, label="6m", step="month", stepmode="backward"),
+                   dict(count=1, label="YTD", step="year", stepmode="todate"),
+                   dict(count=1, label="1y", step="year", stepmode="backward"),
+                   dict(count=2, label="2y", step="year", stepmode="backward"),
+                   dict(count=5, label="5y", step="year", stepmode="backward"),
+                   dict(step="all")]
+INTRADAY_BUTTONS = [dict(count=60, label="1h", step="minute", stepmode="backward"),
+                    dict(count=240, label="4h", step="minute", stepmode="backward"),
+                    dict(count=7, label="1d", step="hour", stepmode="backward"),
+                    dict(step="all")]
+INTRADAY_12H_BUTTONS = [dict(count=60, label="1h", step="minute", stepmode="backward"),
+                        dict(count=240, label="4h", step="minute", stepmode="backward"),
+                        dict(count=12, label="1d", step="hour", stepmode="backward"),
+                        dict(step="all")]
+MULTI_DAY_BUTTONS = [dict(count=12, label="1d", step="hour", stepmode="backward"),
+                     dict(count=2, label="2d", step="day", stepmode="backward"),
+                     dict(count=1, label="1d", step="day", stepmode="backward"),
+                     dict(count=10, label="2w", step="day", stepmode="backward"),
+                     dict(step="all")]
+# Range selector of each type of chart
+CHART_BUTTONS = {'history': HISTORY_BUTTONS,
+                 'intraday': INTRADAY_BUTTONS,
+                 'intraday_12h': INTRADAY_12H_BUTTONS,
+                 'multi_day': MULTI_DAY_BUTTONS}
+
+
+@lru_cache(maxsize=None)
+def _template(name: str):
+    return pio.templates[name].to_plotly_json()
+
+
+@lru_cache(maxsize=None)
+def _layout(chart: str, template: str):
+    return dict(template=_template(template), height=700, margin=dict(t=60),
+                legend=dict(title=dict(text='variable'), tracegroupgap=0),
+                yaxis=dict(autorange=True, fixedrange=False, title=dict(text='value')),
+                xaxis=dict(rangeselector=dict(buttons=CHART_BUTTONS[chart]),
+                           rangeslider=dict(visible=True),
+                           type="date",
+                           title=dict(text='date')))
+
+
+def chart_layout(chart: str, template=None, **overrides):
+    # The skeleton of each type of chart is built once, the top level keys are copied to apply the overrides.
+    # Apps pass their template rather than setting pio.templates.default, which all apps of a process share.
+    layout = dict(_layout(chart, template or pio.templates.default))
+    layout.update(overrides)
+    return layout
+
+
+def line_trace(name: str, x, y, webgl=False):
+    return dict(type='scattergl' if webgl else 'scatter', mode='lines', name=name, x=x, y=y, legendgroup=name,
+                showlegend=True, hovertemplate=f'variable={name}<br>date=%{{x}}<br>value=%{{y}}<extra></extra>')
+
+
+def _slider_outline(x, y, layout):
+    # The outline sits on a hidden y axis whose range lies below the data, so it only shows in the range slider
+    idx = minmax_indices(y, SLIDER_POINTS)
+    outline = dict(type='scatter', mode='lines', x=x[idx], y=y[idx], yaxis='y2', showlegend=False,
+                   hoverinfo='skip', line=dict(width=1))
+    low, high = float(np.nanmin(y)), float(np.nanmax(y))
+    span = (high - low) or 1.
+    layout['yaxis2'] = dict(overlaying='y', visible=False, fixedrange=True, range=[low - 3 * span, low - 2 * span])
+    layout['xaxis'] = dict(layout['xaxis'], rangeslider=dict(visible=True, yaxis2=dict(rangemode='auto')))
+    return outline
+
+
+@instrumented('figure')
+def line_figure(series, chart: str, uirevision=None, webgl=None, template=None, encode=None):
+    """
+    Figure with a line per (name, series) pair of series, in the layout of chart, as a plain dict. Plotly's
+    validation of graph objects is skipped, Dash serializes the dict as it is.
+    With webgl=None, WebGL traces are used when the figure has more than WEBGL_THRESHOLD points, and with
+    encode=None the arrays are encoded as set by ENCODE_ARRAYS.
+    """
+    if webgl is None:
+        webgl = sum(len(s) for _, s in series) > WEBGL_THRESHOLD
+    data = [line_trace(name, s.index.values, np.asarray(s.values, dtype=float), webgl) for name, s in series]
+    layout = chart_layout(chart, template, uirevision=uirevision)
+    if webgl and data and len(data[0]['x']) and not np.isnan(data[0]['y']).all():
+        data.append(_slider_outline(data[0]['x'], data[0]['y'], layout))
+    if ENCODE_ARRAYS if encode is None else encode:
+        data = [encode_trace(trace) for trace in data]
+    return dict(data=data, layout=layout)
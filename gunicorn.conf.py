@@ -0,0 +1,15 @@
+import multiprocessing
+
+# Production settings of wsgi.py, see its docstring
+bind = '0.0.0.0:8000'
+workers = multiprocessing.cpu_count() * 2 + 1
+# Threads per worker, callbacks mostly wait on the provider
+threads = 4
+# The apps and their data are loaded once in the master and shared copy-on-write by the workers
+preload_app = True
+timeout = 120
+
+
+def post_fork(server, worker):
+    from wsgi import start_prefetcher
+    start_prefetcher()
@@ -0,0 +1,112 @@
+import pandas as pd
+from dash import dcc, Input, Output, State, Patch, no_update
+from dash.exceptions import PreventUpdate
+
+from aux import get_bars, get_prices, get_names_symbols
+from downsample import visible_range
+from resample import gap_breaks, pick_level
+from rolling import rolling_means
+
+# Milliseconds between two polls of a live chart
+LIVE_INTERVAL = 60 * 1000
+# Trailing number of points kept per trace while new bars are appended
+LIVE_MAX_POINTS = 5000
+
+
+def live_controls(graph_id: str):
+    # Toggle, timer and last bar shown for a live chart, to be placed next to the graph
+    return [dcc.Checklist(id=f'{graph_id}_live', options=['Live'], value=[], inline=True),
+            dcc.Interval(id=f'{graph_id}_interval', interval=LIVE_INTERVAL, disabled=True),
+            dcc.Store(id=f'{graph_id}_last_bar')]
+
+
+def last_bar(figure):
+    # Date of the last point of the close trace, the live updates start after it, and the level of its bars
+    if figure is None or not figure['data'] or not len(figure['data'][0]['x']):
+        return None
+    return dict(date=str(pd.Timestamp(figure['data'][0]['x'][-1])), freq=figure['layout'].get('meta', {}).get('freq'))
+
+
+def new_bars(name, names_symbols, short_term, long_term, freq, after):
+    """
+    Close and moving averages of the bars from the last bar of the chart on, at the level of the chart's bars.
+    The last bar of a level coarser than freq is still filling up, it is sent again to replace the chart's one,
+    the bars after it are appended. Returns the points of each trace, whether their first one replaces the last
+    point of the chart, and the new last bar. The moving averages reuse the running sums of the full chart.
+    """
+    if after is None:
+        return None
+    ticker = names_symbols.at[name, 'symbol']
+    level = after['freq'] or freq
+    close = get_prices('high_freq', ticker, freq, level=level)
+    if close is None:
+        return None
+    moving_averages = rolling_means.means((ticker, 'high_freq', level), close[ticker], [short_term, long_term])
+    date = pd.Timestamp(after['date'])
+    start = close.index.searchsorted(date)
+    shown = start < len(close) and close.index[start] == date
+    replace = shown and level != freq
+    series = [close[ticker]] + [moving_averages[c] for c in moving_averages.columns]
+    # Starting from the chart's last bar, a break is put before new bars after a closed session
+    series = [gap_breaks(s.iloc[start:], level) for s in series]
+    if shown and not replace:
+        series = [s.iloc[1:] for s in series]
+    if not len(series[0]):
+        return None
+    x = series[0].index.strftime('%Y-%m-%d %H:%M:%S').tolist()
+    return dict(x=x, y=[s.values for s in series], replace=replace), dict(after, date=x[-1])
+
+
+def chart_level(name, names_symbols, freq, relayout):
+    # Level of the bars a rebuilt chart would show for the current view
+    bars = get_bars(names_symbols.at[name, 'symbol'], freq)
+    return None if bars is None else pick_level(bars.index, freq, visible_range(relayout))
+
+
+def live_patch(points):
+    # Replaces the last point of each trace and appends the others, the traces after them are left as they are
+    patch = Patch()
+    for i, y in enumerate(points['y']):
+        x, y = points['x'], y.tolist()
+        if points['replace']:
+            patch['data'][i]['x'][-1] = x[0]
+            patch['data'][i]['y'][-1] = y[0]
+            x, y = x[1:], y[1:]
+        if x:
+            patch['data'][i]['x'].extend(x)
+            patch['data'][i]['y'].extend(y)
+    return patch
+
+
+def register_live_callbacks(app, graph_id, dropdown_id, short_term, long_term, freq, build):
+    # build(name, x_range) returns the figure of the chart, rebuilt when the level of its bars changes
+    @app.callback(Output(f'{graph_id}_interval', 'disabled'), Input(f'{graph_id}_live', 'value'))
+    def toggle_live(live):
+        return not live
+
+    @app.callback(Output(graph_id, 'extendData'),
+                  Output(graph_id, 'figure', allow_duplicate=True),
+                  Output(f'{graph_id}_last_bar', 'data', allow_duplicate=True),
+                  Input(f'{graph_id}_interval', 'n_intervals'),
+                  State(dropdown_id, 'value'),
+                  State(f'{graph_id}_last_bar', 'data'),
+                  State(graph_id, 'relayoutData'),
+                  prevent_initial_call=True)
+    def extend_live(n_intervals, name, after, relayout):
+        if after is None:
+            raise PreventUpdate
+        names_symbols = get_names_symbols()
+        if (after['freq'] or freq) != chart_level(name, names_symbols, freq, relayout):
+            figure = build(name, visible_range(relayout))
+            if figure is None:
+                raise PreventUpdate
+            return no_update, figure, last_bar(figure)
+        update = new_bars(name, names_symbols, short_term, long_term, freq, after)
+        if update is None:
+            raise PreventUpdate
+        points, after = update
+        if points['replace']:
+            # extendData can only append, the partial last bar is replaced through a patch of the figure
+            return no_update, live_patch(points), after
+        extend = dict(x=[points['x']] * len(points['y']), y=points['y'])
+        return (extend, list(range(len(points['y']))), LIVE_MAX_POINTS), no_update, after
@@ -0,0 +1,192 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import flask
+
+# Upper bounds of the histogram buckets, in seconds and in bytes
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+# Number of lines of the profile report, sorted by cumulative time
+PROFILE_LINES = 40
+METRICS_PATH = '/metrics'
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # Per label set: count per bucket, plus the total and number of observations
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(counts), total, n) for key, (counts, total, n) in self._series.items()}
+        for key, (counts, total, n) in sorted(series.items()):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{_join(labels, _le(bound))}}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{_join(labels, _le("+Inf"))}}} {n}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {n}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _le(bound):
+    return f'le="{bound:g}"' if isinstance(bound, (int, float)) else f'le="{bound}"'
+
+
+def _join(*labels):
+    return ','.join(label for label in labels if label)
+
+
+stage_seconds = Histogram('dash_stage_seconds', 'Time spent per stage (network, data, transform, figure) and function',
+                          SECONDS_BUCKETS)
+callback_seconds = Histogram('dash_callback_seconds', 'Time to answer a callback request, serialization included',
+                             SECONDS_BUCKETS)
+payload_bytes = Histogram('dash_callback_payload_bytes', 'Size of the callback responses', BYTES_BUCKETS)
+HISTOGRAMS = [stage_seconds, callback_seconds, payload_bytes]
+
+
+@contextmanager
+def timed(stage: str, name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage, name=name)
+
+
+def instrumented(stage: str, name=None):
+    # Decorator recording the duration of every call of the function in stage_seconds
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage, name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def expose():
+    # Provider counters are imported here, so that the client is only loaded by apps that use it
+    from client import client
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.expose()
+    for name, value in client.stats().items():
+        lines += [f'# TYPE dash_provider_{name} gauge', f'dash_provider_{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+class _Profiles:
+    # One-shot capture: the next callback request whose outputs contain the armed pattern runs under cProfile
+    def __init__(self):
+        self.pattern = None
+        self.report = 'No profile captured yet'
+        self._lock = threading.Lock()
+
+    def arm(self, pattern: str):
+        with self._lock:
+            self.pattern = pattern
+
+    def take(self, output: str):
+        with self._lock:
+            if self.pattern is None or self.pattern not in output:
+                return False
+            self.pattern = None
+            return True
+
+    def store(self, output: str, profiler: cProfile.Profile):
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        with self._lock:
+            self.report = f'{output}\n{stream.getvalue()}'
+
+
+profiles = _Profiles()
+
+
+def _callback_output():
+    # Outputs of a callback request, e.g. 'close_price_1.figure', which identify the callback
+    if not flask.request.path.endswith('_dash-update-component'):
+        return None
+    body = flask.request.get_json(silent=True) or {}
+    output = body.get('output')
+    return output if isinstance(output, str) else json.dumps(output)
+
+
+def instrument(app):
+    """
+    Record the latency and payload size of every callback of a Dash app, and serve all metrics in the Prometheus
+    text format at METRICS_PATH. GET METRICS_PATH/profile?capture=<output> profiles the next request of the
+    callback with that output, the report is then served at METRICS_PATH/profile.
+    """
+    server = app.server
+
+    @server.before_request
+    def start_timer():
+        output = _callback_output()
+        if output is None:
+            return
+        flask.g.metrics_output = output
+        if profiles.take(output):
+            flask.g.metrics_profiler = cProfile.Profile()
+            flask.g.metrics_profiler.enable()
+        flask.g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record(response):
+        output = flask.g.pop('metrics_output', None)
+        if output is None:
+            return response
+        callback_seconds.observe(time.perf_counter() - flask.g.pop('metrics_start'), callback=output)
+        if not response.direct_passthrough:
+            payload_bytes.observe(len(response.get_data()), callback=output,
+                                  encoding=response.headers.get('Content-Encoding', 'identity'))
+        profiler = flask.g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            profiles.store(output, profiler)
+        return response
+
+    @server.route(METRICS_PATH)
+    def metrics():
+        return flask.Response(expose(), mimetype='text/plain; version=0.0.4')
+
+    @server.route(f'{METRICS_PATH}/profile')
+    def profile():
+        capture = flask.request.args.get('capture')
+        if capture:
+            profiles.arm(capture)
+            return flask.Response(f'Profiling the next request of {capture}\n', mimetype='text/plain')
+        return flask.Response(profiles.report, mimetype='text/plain')
+
+    return app
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import dash_bootstrap_components as dbc
+import pandas as pd
+from dash import dcc, html
+
+from cache import SnapshotCache
+from client import top_news
+from metrics import instrumented
+from stats import access_stats
+
+# Seconds a ticker's news are served from the cache
+NEWS_TTL = 5 * 60
+NEWS_MAX_TICKERS = 512
+# Number of articles fetched per ticker, panels show at most this many
+NEWS_LIMIT = 50
+# Requests arriving within this many seconds of each other are sent upstream together
+BATCH_WINDOW = 0.05
+NEWS_COLUMNS = ['publishedDate', 'title', 'text', 'url']
+CELL_STYLE = {'white-space': 'nowrap', 'padding': '3px'}
+
+news_cache = SnapshotCache('news', ttl=NEWS_TTL, max_entries=NEWS_MAX_TICKERS)
+
+
+def _split_by_ticker(news, tickers):
+    # Articles are grouped by their symbol, and an article appearing twice is only kept once
+    records = [r for value in news.values() for r in (value if isinstance(value, list) else [])]
+    by_ticker = {t: [] for t in tickers}
+    seen = {t: set() for t in tickers}
+    for r in records:
+        ticker = r.get('symbol', tickers[0]) if len(tickers) > 1 else tickers[0]
+        if ticker in by_ticker and r.get('url') not in seen[ticker]:
+            seen[ticker].add(r.get('url'))
+            by_ticker[ticker].append(r)
+    return by_ticker
+
+
+def fetch_news(tickers, limit=NEWS_LIMIT, max_requests=None, stats=None):
+    """
+    News of each ticker, fetched in one merged call. A busy ticker can take the whole quota of that call, so the
+    tickers left without news are asked alone, within max_requests calls in all: those that would need more are left
+    out of the result. The number of calls made is added to stats['requests'].
+    """
+    tickers = list(tickers)
+    by_ticker = _split_by_ticker(top_news(tickers, limit=limit * len(tickers)), tickers)
+    requests = 1
+    if len(tickers) > 1:
+        for ticker in [t for t, records in by_ticker.items() if not records]:
+            if max_requests is not None and requests >= max_requests:
+                del by_ticker[ticker]
+                continue
+            by_ticker[ticker] = _split_by_ticker(top_news([ticker], limit=limit), [ticker])[ticker]
+            requests += 1
+    if stats is not None:
+        stats['requests'] = stats.get('requests', 0) + requests
+    return {ticker: records[:limit] for ticker, records in by_ticker.items()}
+
+
+class _Batcher:
+    # The first caller waits for BATCH_WINDOW, then fetches every ticker requested in the meantime in one call
+    def __init__(self, fetch, window=BATCH_WINDOW):
+        self.fetch = fetch
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = None
+
+    def get(self, ticker):
+        with self._lock:
+            leader = self._pending is None
+            if leader:
+                self._pending = {'tickers': set(), 'done': threading.Event(), 'result': {}, 'error': None}
+            pending = self._pending
+            pending['tickers'].add(ticker)
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                self._pending = None
+            try:
+                pending['result'] = self.fetch(sorted(pending['tickers']))
+            except Exception as error:
+                pending['error'] = error
+            finally:
+                pending['done'].set()
+        else:
+            pending['done'].wait()
+        if pending['error'] is not None:
+            raise pending['error']
+        return pending['result'].get(ticker, [])
+
+
+_batcher = _Batcher(fetch_news)
+
+
+@instrumented('data')
+def get_news(ticker: str, limit=NEWS_LIMIT):
+    access_stats.record('news', ticker)
+    return news_cache.get_or_set(ticker, lambda: _batcher.get(ticker))[:limit]
+
+
+def prefetch_news(tickers, force=False, max_requests=None):
+    # Fill the cache for several tickers with a merged upstream call, and return the number of calls made
+    missing = [t for t in tickers if force or news_cache.get(t) is None]
+    if not missing:
+        return 0
+    stats = {}
+    for ticker, records in fetch_news(missing, max_requests=max_requests, stats=stats).items():
+        news_cache.set(ticker, records)
+    return stats['requests']
+
+
+def news_table(records):
+    try:
+        df = pd.DataFrame.from_records(records).loc[:, NEWS_COLUMNS]
+    except KeyError:
+        return None
+    dates = df['publishedDate'].str[:11]
+    times = df['publishedDate'].str[11:]
+    # Columns are read once, instead of looking each cell up by position
+    rows = [html.Tr([html.Td(date, style=CELL_STYLE),
+                     html.Td(time_, style=CELL_STYLE),
+                     dcc.Link(html.A(title), href=url, target="_blank")])
+            for date, time_, title, url in zip(dates, times, df['title'], df['url'])]
+    table = html.Table([
+        html.Thead(html.Tr([html.Th(col) for col in ['Date', 'Time', 'Title']], style=CELL_STYLE)),
+        html.Tbody(rows)
+    ])
+    return dbc.Table(table, bordered=True, striped=True, responsive=True, color='light',
+                     style={'white-space': 'nowrap', 'border-spacing': '3px'})
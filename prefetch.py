@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+
+import symbols
+from aux import get_prices, quote_batches
+from news_feed import NEWS_TTL, prefetch_news
+from quotes import QUOTES_TTL, refresh_exchange_quotes
+from stats import access_stats
+
+# Seconds between two checks for the caches due for a warm-up
+PREFETCH_INTERVAL = 10
+# A cache is warmed again once this fraction of its TTL has passed, so that its entries never expire in between
+REFRESH_FRACTION = 0.8
+# Seconds between two checks of the age of the symbol list, which is downloaded again after symbols.REFRESH_INTERVAL
+SYMBOL_LIST_CHECK = 60 * 60
+# Maximum number of upstream requests a single run may spend
+REQUEST_BUDGET = 60
+# Number of most requested symbols and exchanges warmed on top of the watch list
+TOP_REQUESTED = 10
+
+
+def _merge(watch_list, requested):
+    return list(dict.fromkeys(list(watch_list) + requested))
+
+
+class Prefetcher:
+    # Keeps the symbol list fresh and warms the price, quote and news caches in a background thread, each one before
+    # its TTL runs out, for a watch list and the most requested keys, spending at most budget upstream requests per run.
+    def __init__(self, symbols=(), exchanges=(), interval=PREFETCH_INTERVAL, budget=REQUEST_BUDGET,
+                 top_requested=TOP_REQUESTED):
+        self.symbols = list(symbols)
+        self.exchanges = list(exchanges)
+        self.interval = interval
+        self.budget = budget
+        self.top_requested = top_requested
+        # Time at which each warm-up is due next
+        self._due = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def warm_quotes(self, budget):
+        for exch in _merge(self.exchanges, access_stats.most_common('exchange', self.top_requested)):
+            cost = len(quote_batches(exch))
+            if cost > budget:
+                logging.warning(f'Skipping the warm-up of {exch}, {cost} requests left the budget at {budget}')
+                continue
+            refresh_exchange_quotes(exch)
+            budget -= cost
+        return budget
+
+    def warm_symbols(self, budget):
+        tickers = _merge(self.symbols, access_stats.most_common('symbol', self.top_requested) +
+                         access_stats.most_common('news', self.top_requested))
+        # At most one request per price history, only made once it is stale, and what is left for the news: one
+        # merged call, then one per ticker it left without news
+        tickers = tickers[:max(budget - 1, 0)]
+        for ticker in tickers:
+            get_prices('all', ticker)
+        budget -= len(tickers)
+        if tickers:
+            budget -= prefetch_news(tickers, force=True, max_requests=budget)
+        return budget
+
+    def warm_symbol_list(self, budget):
+        # The workers pick up the new list from its file, see symbols._get
+        if budget >= 1 and symbols.refresh_if_stale():
+            budget -= 1
+        return budget
+
+    def schedule(self):
+        # (name, period, warm-up) of each group of caches, the period following the TTL of the caches warmed
+        return [('symbol_list', SYMBOL_LIST_CHECK, self.warm_symbol_list),
+                ('quotes', QUOTES_TTL * REFRESH_FRACTION, self.warm_quotes),
+                ('symbols', NEWS_TTL * REFRESH_FRACTION, self.warm_symbols)]
+
+    def run_once(self, now=None):
+        now = time.time() if now is None else now
+        budget = self.budget
+        for name, period, warm in self.schedule():
+            if now >= self._due.get(name, 0):
+                budget = warm(budget)
+                self._due[name] = now + period
+        return budget
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception('Warm-up run failed')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='prefetch', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,121 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# On-disk store of daily closes, one memory-mapped .npy file per symbol
+STORE_DIR = os.environ.get('PRICE_STORE_DIR', 'price_store')
+# Minimum number of seconds between two upstream top-ups of the same symbol
+REFRESH_INTERVAL = 60 * 60
+RECORD_DTYPE = np.dtype([('date', 'datetime64[ns]'), ('close', 'float64')])
+
+
+def _path(symbol: str):
+    return os.path.join(STORE_DIR, symbol.replace(os.sep, '_') + '.npy')
+
+
+def load(symbol: str):
+    path = _path(symbol)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode='r')
+
+
+def save(symbol: str, records):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = _path(symbol)
+    # Write to a temporary file first, so that readers never see a half written array
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
+
+
+def to_records(prices):
+    prices = prices.sort_values('date')
+    records = np.empty(len(prices), dtype=RECORD_DTYPE)
+    records['date'] = pd.to_datetime(prices['date']).values
+    records['close'] = prices['close'].values
+    return records
+
+
+def to_frame(symbol: str, records):
+    return pd.DataFrame({symbol: np.asarray(records['close'])},
+                        index=pd.DatetimeIndex(records['date'], name='date')).rename_axis(columns='symbol')
+
+
+def _is_stale(symbol: str):
+    return time.time() - os.path.getmtime(_path(symbol)) >= REFRESH_INTERVAL
+
+
+def _update(symbol: str, stored, new):
+    if new is None or new.empty:
+        if stored is None:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        # Nothing new upstream, reset the refresh clock
+        os.utime(_path(symbol))
+        return stored
+    new = to_records(new)
+    if stored is not None:
+        # The new bars replace the stored ones from their first date on, e.g. a close fetched during the session
+        new = np.concatenate([stored[stored['date'] < new['date'][0]], new])
+    save(symbol, new)
+    return new
+
+
+def get_records(symbols, fetch):
+    """
+    Return the daily closes of each symbol as a dict of record arrays, downloading only the bars from the
+    last stored dates on, the last stored bar being fetched again in case it was partial. Symbols needing the
+    same start date are requested together, so that fetch(symbols, start_date) is called once per distinct
+    start date. It must return a frame with 'symbol', 'date' and 'close' columns,
+    or None if nothing is available.
+    """
+    stored = {symbol: load(symbol) for symbol in symbols}
+    to_fetch = {}
+    for symbol, records in stored.items():
+        if records is None:
+            to_fetch.setdefault('beginning', []).append(symbol)
+        elif _is_stale(symbol):
+            start_date = pd.Timestamp(records['date'][-1]).strftime('%Y-%m-%d')
+            to_fetch.setdefault(start_date, []).append(symbol)
+
+    for start_date, group in to_fetch.items():
+        new = fetch(group, start_date)
+        # Split by symbol in one pass, rather than scanning the whole frame for each symbol
+        parts = {} if new is None or new.empty else dict(list(new.groupby('symbol', sort=False)))
+        for symbol in group:
+            part = parts.get(symbol)
+            stored[symbol] = _update(symbol, stored[symbol], None if part is None else part.loc[:, ['date', 'close']])
+    return stored
+
+
+def to_wide_frame(records_by_symbol, days=None):
+    """
+    Date by symbol frame of the closes, filled with NumPy rather than by aligning one frame per symbol. With days,
+    only the dates within that many days of the latest date are kept.
+    """
+    symbols = list(records_by_symbol)
+    dates = [np.asarray(records_by_symbol[s]['date']) for s in symbols]
+    closes = [np.asarray(records_by_symbol[s]['close']) for s in symbols]
+    if days is not None:
+        latest = max((d[-1] for d in dates if len(d)), default=np.datetime64('NaT'))
+        starts = [d.searchsorted(latest - np.timedelta64(days, 'D')) for d in dates]
+        dates = [d[i:] for d, i in zip(dates, starts)]
+        closes = [c[i:] for c, i in zip(closes, starts)]
+    index = np.unique(np.concatenate(dates)) if dates else np.empty(0, dtype='datetime64[ns]')
+    matrix = np.full((len(index), len(symbols)), np.nan)
+    for j, (d, c) in enumerate(zip(dates, closes)):
+        matrix[index.searchsorted(d), j] = c
+    return pd.DataFrame(matrix, index=pd.DatetimeIndex(index, name='date'),
+                        columns=pd.Index(symbols, name='symbol'))
+
+
+def get_histories(symbols, fetch):
+    # Same as get_records, as a dict of date-indexed frames
+    return {symbol: to_frame(symbol, records) for symbol, records in get_records(symbols, fetch).items()}
+
+
+def get_history(symbol: str, fetch):
+    return get_histories([symbol], fetch)[symbol]
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metrics import instrumented
+
+# Prices stay float64: above 2**17, e.g. BRK-A, float32 steps are coarser than a cent
+FLOAT64_COLUMNS = ['price', 'change', 'dayLow', 'dayHigh', 'yearHigh', 'yearLow', 'priceAvg50', 'priceAvg200', 'open',
+                   'previousClose']
+# Ratios, for which float32 keeps more precision than the quotes have
+FLOAT32_COLUMNS = ['changesPercentage', 'eps', 'pe']
+CATEGORICAL_COLUMNS = ['exchange']
+# Unix timestamps in seconds, and date strings
+TIMESTAMP_COLUMNS = ['timestamp']
+DATE_COLUMNS = ['earningsAnnouncement']
+
+# Derived columns, computed in order on every batch of quotes as it arrives
+METRICS = OrderedDict()
+
+
+def register_metric(name: str):
+    """
+    Register func(df) -> Series as the derived column name of the exchange quotes. func receives a batch of quotes
+    with the raw columns and the metrics registered before it, and must be vectorized.
+    """
+    def decorator(func):
+        METRICS[name] = func
+        return func
+    return decorator
+
+
+@register_metric('price_to_yearHighpercent')
+def price_to_year_high(df):
+    return df['price'] / df['yearHigh'] * 100
+
+
+@register_metric('voltoavgvolume')
+def volume_to_average_volume(df):
+    return df['volume'] / df['avgVolume']
+
+
+@register_metric('marketCap')
+def market_cap_billions(df):
+    return df['marketCap'] * 1e-9
+
+
+def _compact(df):
+    for column in FLOAT64_COLUMNS:
+        if column in df:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float64)
+    for column in FLOAT32_COLUMNS:
+        if column in df:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float32)
+    for column in TIMESTAMP_COLUMNS:
+        if column in df:
+            df[column] = pd.to_datetime(df[column], unit='s', errors='coerce')
+    for column in DATE_COLUMNS:
+        if column in df:
+            df[column] = pd.to_datetime(df[column], errors='coerce', utc=True)
+    return df
+
+
+@instrumented('transform')
+def process_batch(df):
+    # Runs in the thread that fetched the batch, so that batches are processed while the others are downloaded
+    df = _compact(df.copy())
+    for name, func in METRICS.items():
+        df[name] = func(df)
+    return df
+
+
+def finish(df):
+    # Categories are set once the batches are put together, so that they share the same ones
+    for column in CATEGORICAL_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    return df
@@ -0,0 +1,24 @@
+from aux import get_all_quotes
+from cache import SnapshotCache
+from quote_pipeline import process_batch, finish
+from stats import access_stats
+
+# Exchange quotes are shared by all sessions for QUOTES_TTL seconds
+QUOTES_TTL = 60
+QUOTES_MAX_EXCHANGES = 16
+quotes_cache = SnapshotCache('quotes', ttl=QUOTES_TTL, max_entries=QUOTES_MAX_EXCHANGES)
+
+
+def enriched_quotes(exch):
+    # Compact dtypes and derived metrics are applied to every batch, see quote_pipeline.register_metric
+    return finish(get_all_quotes(exch, process=process_batch))
+
+
+def get_exchange_quotes(exch):
+    # The cached frame is shared between sessions, so it must not be modified by the callers
+    access_stats.record('exchange', exch)
+    return quotes_cache.get_or_set(exch, lambda: enriched_quotes(exch))
+
+
+def refresh_exchange_quotes(exch):
+    quotes_cache.set(exch, enriched_quotes(exch))
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from cache import SnapshotCache
+from downsample import MAX_POINTS
+from metrics import instrumented
+
+# Aggregation levels of the intraday bars, finest first
+LEVELS = ['1min', '5min', '15min', '1h', '1D']
+# How the columns of the bars falling in a coarser bar are combined
+AGGREGATIONS = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+# Gaps between bars longer than this, e.g. closed sessions, are not bridged by the chart lines
+MIN_GAP = pd.Timedelta('1h')
+BARS_TTL = 60 * 60
+BARS_CACHE_SIZE = 256
+bars_cache = SnapshotCache('bars', ttl=BARS_TTL, max_entries=BARS_CACHE_SIZE)
+
+
+@instrumented('transform')
+def aggregate(bars, level: str):
+    columns = {column: func for column, func in AGGREGATIONS.items() if column in bars}
+    # Bins without any bar are dropped rather than kept as empty rows
+    return bars.resample(level, label='left', closed='left').agg(columns).dropna(subset=['close'])
+
+
+def bars_at(ticker: str, bars, base: str, level: str):
+    # The finest bars are kept as they are, each coarser level is computed once per version of them
+    if level == base:
+        return bars
+    version = (len(bars), bars.index[-1] if len(bars) else None)
+    return bars_cache.get_or_set((ticker, base, level, version), lambda: aggregate(bars, level))
+
+
+def close_at(ticker: str, bars, base: str, level: str):
+    return bars_at(ticker, bars, base, level).loc[:, ['close']].rename(columns={'close': ticker})
+
+
+def pick_level(index, base: str, x_range=None, max_points=MAX_POINTS):
+    """
+    Finest level at which the bars of x_range, or all of them, fit in about max_points, i.e. the coarsest level the
+    view needs. Levels finer than the base frequency of the bars are never picked.
+    """
+    n = len(index)
+    if x_range is not None:
+        n = index.searchsorted(pd.Timestamp(x_range[1]), 'right') - index.searchsorted(pd.Timestamp(x_range[0]))
+    levels = LEVELS[LEVELS.index(base):] if base in LEVELS else [base]
+    for level in levels:
+        if n * pd.Timedelta(base) / pd.Timedelta(level) <= max_points:
+            return level
+    return levels[-1]
+
+
+def gap_breaks(series, level: str):
+    # One empty point in each long gap, so that the line stops there instead of being drawn across it
+    if len(series) < 2 or pd.Timedelta(level) >= pd.Timedelta('1D'):
+        return series
+    gaps = np.flatnonzero(np.diff(series.index.values) > max(MIN_GAP, pd.Timedelta(level)).to_timedelta64())
+    if not len(gaps):
+        return series
+    breaks = pd.Series(np.nan, index=series.index[gaps] + pd.Timedelta(level), name=series.name)
+    return pd.concat([series, breaks]).sort_index()
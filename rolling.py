@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Number of (symbol, frequency) series whose running sums are kept in memory
+MAX_SERIES = 256
+DAY_NS = 24 * 60 * 60 * 10 ** 9
+
+
+def _window_means(dates, sums, counts, positions, windows_ns):
+    # Mean over the time window (t - w, t] ending at each position, for every window at once.
+    # sums and counts are running totals with a leading zero, so that a window total is a difference of two entries.
+    ends = dates[positions]
+    starts = np.searchsorted(dates, (ends[None, :] - windows_ns[:, None]).ravel(), side='right')
+    starts = starts.reshape(len(windows_ns), len(positions))
+    window_sums = sums[positions + 1][None, :] - sums[starts]
+    window_counts = counts[positions + 1][None, :] - counts[starts]
+    return np.divide(window_sums, window_counts, out=np.full(window_sums.shape, np.nan), where=window_counts > 0).T
+
+
+def rolling_means_frame(frame: pd.DataFrame, windows):
+    """
+    Time based rolling means of every column of frame, for every window, in one vectorized pass.
+    Returns a dict from f'{w}d-MA' to a frame shaped like frame.
+    """
+    dates = frame.index.values.astype('datetime64[ns]').view('int64')
+    values = frame.to_numpy(dtype=float)
+    finite = ~np.isnan(values)
+    zeros = np.zeros((1, values.shape[1]))
+    sums = np.vstack([zeros, np.cumsum(np.where(finite, values, 0.), axis=0)])
+    counts = np.vstack([zeros, np.cumsum(finite, axis=0)])
+    windows_ns = np.array(windows, dtype='int64') * DAY_NS
+    starts = np.searchsorted(dates, (dates[None, :] - windows_ns[:, None]).ravel(), side='right')
+    starts = starts.reshape(len(windows_ns), len(dates))
+    # Shape (windows, dates, columns)
+    window_sums = sums[1:][None, :, :] - sums[starts]
+    window_counts = counts[1:][None, :, :] - counts[starts]
+    means = np.divide(window_sums, window_counts, out=np.full(window_sums.shape, np.nan), where=window_counts > 0)
+    return {f'{w}d-MA': pd.DataFrame(means[i], index=frame.index, columns=frame.columns) for i, w in enumerate(windows)}
+
+
+class _State:
+    def __init__(self, dates, values, windows_ns):
+        self.windows_ns = windows_ns
+        self.dates = dates
+        self.last_value = values[-1] if len(values) else np.nan
+        finite = ~np.isnan(values)
+        self.sums = np.concatenate([[0.], np.cumsum(np.where(finite, values, 0.))])
+        self.counts = np.concatenate([[0], np.cumsum(finite)])
+        self.means = _window_means(dates, self.sums, self.counts, np.arange(len(dates)), windows_ns)
+
+    def extends(self, dates, values):
+        # True when the series only has new bars appended after the ones already summed up
+        n = len(self.dates)
+        if n == 0 or len(dates) < n or dates[n - 1] != self.dates[-1]:
+            return False
+        return values[n - 1] == self.last_value or (np.isnan(values[n - 1]) and np.isnan(self.last_value))
+
+    def append(self, dates, values):
+        n = len(self.dates)
+        new_values = values[n:]
+        if len(new_values) == 0:
+            return
+        finite = ~np.isnan(new_values)
+        self.dates = dates
+        self.last_value = values[-1]
+        self.sums = np.concatenate([self.sums, self.sums[-1] + np.cumsum(np.where(finite, new_values, 0.))])
+        self.counts = np.concatenate([self.counts, self.counts[-1] + np.cumsum(finite)])
+        new_means = _window_means(dates, self.sums, self.counts, np.arange(n, len(dates)), self.windows_ns)
+        self.means = np.concatenate([self.means, new_means])
+
+
+class RollingMeans:
+    # Time based rolling means, equivalent to series.rolling(f'{w}d').mean(), kept per key together with
+    # the running sums they are computed from. A series that only gained new bars is updated in O(new bars).
+    def __init__(self, max_series=MAX_SERIES):
+        self.max_series = max_series
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def means(self, key, close: pd.Series, windows):
+        windows = tuple(windows)
+        dates = close.index.values.astype('datetime64[ns]').view('int64')
+        values = close.to_numpy(dtype=float)
+        with self._lock:
+            state = self._states.get((key, windows))
+            if state is not None and state.extends(dates, values):
+                self._states.move_to_end((key, windows))
+                state.append(dates, values)
+            else:
+                state = _State(dates, values, np.array(windows, dtype='int64') * DAY_NS)
+                self._states[(key, windows)] = state
+                while len(self._states) > self.max_series:
+                    self._states.popitem(last=False)
+            means = state.means
+        return pd.DataFrame(means, index=close.index, columns=[f'{w}d-MA' for w in windows])
+
+
+rolling_means = RollingMeans()
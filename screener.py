@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from aux import get_prices_many
+from cache import SnapshotCache
+from metrics import instrumented
+from price_store import REFRESH_INTERVAL
+from quotes import get_exchange_quotes
+from rolling import rolling_means_frame
+
+# Number of trading days in which a crossing of the moving averages is reported
+CROSS_LOOKBACK = 10
+# Columns added to the exchange quotes in screener mode
+SCREEN_COLUMNS = ['shortMA', 'longMA', 'price_to_shortMApercent', 'price_to_longMApercent', 'maCross',
+                  'maCrossDaysAgo']
+SCREENS_MAX_EXCHANGES = 16
+# Screens only change with the daily closes, they are recomputed when the price store refreshes
+screen_cache = SnapshotCache('screens', ttl=REFRESH_INTERVAL, max_entries=SCREENS_MAX_EXCHANGES)
+# Seconds before a screen whose build failed is tried again
+SCREEN_RETRY = 10 * 60
+# Background threads building a screen, and (time, error) of the failed builds, by (exchange, short_term, long_term)
+_building = {}
+_failed = {}
+_building_lock = threading.Lock()
+
+
+@instrumented('transform')
+def screen(close, short_term: int, long_term: int, lookback=CROSS_LOOKBACK):
+    """
+    Moving averages, distance of the last close to them and latest crossing of the short above ('golden') or below
+    ('death') the long one within lookback days, for every column of a date by symbol frame of closes at once.
+    """
+    if close.empty:
+        # No symbol has any close, every column is empty
+        return pd.DataFrame({'shortMA': np.nan, 'longMA': np.nan, 'price_to_shortMApercent': np.nan,
+                             'price_to_longMApercent': np.nan, 'maCross': '', 'maCrossDaysAgo': np.nan},
+                            index=close.columns)
+    means = rolling_means_frame(close, [short_term, long_term])
+    short = means[f'{short_term}d-MA'].to_numpy()
+    long = means[f'{long_term}d-MA'].to_numpy()
+    values = close.to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    # Last row with a close of each symbol, which may be older for symbols that stopped trading
+    last = len(values) - 1 - valid[::-1].argmax(axis=0)
+    columns = np.arange(values.shape[1])
+    last_close = np.where(valid.any(axis=0), values[last, columns], np.nan)
+    last_short, last_long = short[last, columns], long[last, columns]
+
+    # Side of the short average relative to the long one, on the days with a close
+    side = np.where(valid, np.sign(short - long), np.nan)[-(lookback + 1):]
+    side = pd.DataFrame(side).ffill().to_numpy()
+    crossed = (side[1:] != side[:-1]) & ~np.isnan(side[:-1]) & (side[1:] != 0)
+    any_cross = crossed.any(axis=0)
+    if not len(crossed):
+        # A single day of closes, nothing can have crossed
+        crossed = np.zeros((1, values.shape[1]), dtype=bool)
+        side = np.vstack([side, side])
+    latest = len(crossed) - 1 - crossed[::-1].argmax(axis=0)
+    direction = side[1:][latest, columns]
+    return pd.DataFrame({
+        'shortMA': last_short,
+        'longMA': last_long,
+        'price_to_shortMApercent': (last_close / last_short - 1) * 100,
+        'price_to_longMApercent': (last_close / last_long - 1) * 100,
+        'maCross': np.where(any_cross, np.where(direction > 0, 'golden', 'death'), ''),
+        'maCrossDaysAgo': np.where(any_cross, len(crossed) - 1 - latest, np.nan),
+    }, index=close.columns)
+
+
+def _exchange_screen(exch: str, short_term: int, long_term: int):
+    tickers = get_exchange_quotes(exch)['symbol'].dropna().unique().tolist()
+    # Only the days that the long average and the crossings look at are kept, for all symbols in one go
+    return screen(get_prices_many(tickers, days=long_term + 2 * CROSS_LOOKBACK), short_term, long_term)
+
+
+def _build_screen(key):
+    try:
+        # The cache lock keeps the workers of a host from building the same screen
+        screen_cache.get_or_set(key, lambda: _exchange_screen(*key))
+    except Exception as error:
+        logging.exception(f'Screen of {key[0]} failed')
+        with _building_lock:
+            _failed[key] = (time.time(), error)
+    finally:
+        with _building_lock:
+            del _building[key]
+
+
+def get_exchange_screen(exch: str, short_term: int, long_term: int):
+    """
+    Cached screen of the exchange, or None while a background thread builds it. On a cold exchange the histories
+    take one request per HISTORY_BATCH_SIZE symbols, far longer than a callback may last. A failed build is not
+    tried again for SCREEN_RETRY seconds, see screen_error.
+    """
+    key = (exch, short_term, long_term)
+    screen = screen_cache.get(key)
+    if screen is not None:
+        return screen
+    with _building_lock:
+        if screen_error(exch, short_term, long_term) is not None:
+            return None
+        _failed.pop(key, None)
+        if key not in _building:
+            _building[key] = threading.Thread(target=_build_screen, args=(key,), name=f'screen-{exch}', daemon=True)
+            _building[key].start()
+    return None
+
+
+def screen_error(exch: str, short_term: int, long_term: int):
+    # Error of the last build of the screen, if it failed less than SCREEN_RETRY seconds ago
+    failure = _failed.get((exch, short_term, long_term))
+    if failure is None or time.time() - failure[0] >= SCREEN_RETRY:
+        return None
+    return failure[1]
+
+
+def screened_quotes(exch: str, short_term: int, long_term: int):
+    # A new frame, the cached quotes are shared between sessions. None while the screen is being built or failed.
+    screen = get_exchange_screen(exch, short_term, long_term)
+    if screen is None:
+        return None
+    return get_exchange_quotes(exch).join(screen, on='symbol')
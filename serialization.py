@@ -0,0 +1,88 @@
+import base64
+import gzip
+
+import flask
+import numpy as np
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent as they are, compressing them costs more than it saves
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/')
+# Units tried for the dates of a trace, the first one that loses nothing is used
+DATE_UNITS = ['D', 'm', 's', 'ms']
+
+if orjson is not None:
+    # Dash encodes callback outputs with plotly's JSON encoder, with orjson it serializes NumPy arrays natively
+    pio.json.config.default_engine = 'orjson'
+
+
+def typed_array(values):
+    # Base64 typed array, decoded by plotly.js: the payload is the array's own buffer, with no float formatting
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    return dict(dtype='f8', bdata=base64.b64encode(values).decode('ascii'))
+
+
+def compact_dates(values):
+    # Date strings with the coarsest precision that keeps every date, e.g. '2024-06-28' rather than
+    # '2024-06-28T00:00:00.000000000' for daily bars
+    values = np.asarray(values, dtype='datetime64[ns]')
+    known = values[~np.isnat(values)]
+    unit = next((u for u in DATE_UNITS if (known == known.astype(f'datetime64[{u}]')).all()), 'ns')
+    return np.datetime_as_string(values, unit=unit).tolist()
+
+
+def encode_trace(trace):
+    trace = dict(trace)
+    if np.issubdtype(np.asarray(trace['x']).dtype, np.datetime64):
+        trace['x'] = compact_dates(trace['x'])
+    trace['y'] = typed_array(trace['y'])
+    return trace
+
+
+def encode_body(data: bytes, encoding: str):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL)
+
+
+def _accepted_encoding():
+    accepted = flask.request.headers.get('Accept-Encoding', '')
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(server):
+    """
+    Compress the responses of a Flask server with brotli, when installed, or gzip, as accepted by the browser.
+    Register it after metrics.instrument, so that the payload sizes recorded are the compressed ones.
+    """
+    @server.after_request
+    def compress_response(response):
+        encoding = _accepted_encoding()
+        if (encoding is None or response.direct_passthrough or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(encode_body(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return server
@@ -0,0 +1,20 @@
+import threading
+from collections import Counter, defaultdict
+
+
+class AccessStats:
+    # Number of requests per kind ('symbol', 'exchange', 'news') and key, within this process
+    def __init__(self):
+        self._counts = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, key):
+        with self._lock:
+            self._counts[kind][key] += 1
+
+    def most_common(self, kind: str, n: int):
+        with self._lock:
+            return [key for key, _ in self._counts[kind].most_common(n)]
+
+
+access_stats = AccessStats()
@@ -1,18 +1,31 @@
-import plotly.io as pio
-from dash import Dash, dcc, html, Input, Output
-from aux import get_names_symbols, graph_callback_all_history, graph_callback_high_freq
-
-# List of options for tickers based on the list of available symbols
-names_symbols = get_names_symbols()
-
-# Template
-pio.templates.default = "simple_white"
-
-# Values to compute the averages of the means
+from functools import partial
+
+from dash import Dash, dcc, html, Input, Output, ctx, no_update
+from aux import get_names_symbols, graph_callback_high_freq, get_prices_many, compare_callback
+from downsample import zoomed_range
+from symbol_search import register_search_callbacks
+from symbols import get_symbol_index
+from live import live_controls, last_bar, register_live_callbacks
+from client_ma import ma_controls, close_data, register_client_ma
+from prefetch import Prefetcher
+from metrics import instrument
+from serialization import compress
+
+# Template of the charts, passed to each figure rather than set as plotly's default, which the other apps share
+TEMPLATE = "simple_white"
+
+# Values to compute the averages of the means, the history charts start with these and can pick others
 SHORT_TERM = 15
 LONG_TERM = 50
 
+# WebGL traces in the charts: True, False, or None to switch on above figures.WEBGL_THRESHOLD points
+WEBGL = None
+
 app = Dash(__name__)
+# Callback latencies, payload sizes and data stage timings are served at /metrics
+instrument(app)
+# Registered after instrument, so that the compressed sizes are recorded
+compress(app.server)
 app.layout = html.Div(children=[html.Div(className='row', children=[
     html.H4('Closing price'),
     html.Div(className='row', children=[
@@ -20,16 +33,18 @@ app.layout = html.Div(children=[html.Div(className='row', children=[
             id='name_1',
             value='Netflix, Inc., NFLX',
             clearable=True,
-            options=names_symbols.index
+            options=['Netflix, Inc., NFLX']
         ),
+        *ma_controls('close_price_1', [SHORT_TERM, LONG_TERM]),
         dcc.Graph(id='close_price_1')], style={'display': 'inline-block', 'width': '48%', 'height': '700'}),
     html.Div(children=[
         dcc.Dropdown(
             id='name_2',
             value='Netflix, Inc., NFLX',
             clearable=True,
-            options=names_symbols.index
+            options=['Netflix, Inc., NFLX']
         ),
+        *ma_controls('close_price_2', [SHORT_TERM, LONG_TERM]),
         dcc.Graph(id='close_price_2')], style={'display': 'inline-block', 'width': '48%', 'height': '700'}),
 
 ]),
@@ -40,174 +55,89 @@ app.layout = html.Div(children=[html.Div(className='row', children=[
             id='name_3',
             value='Netflix, Inc., NFLX',
             clearable=True,
-            options=names_symbols.index
+            options=['Netflix, Inc., NFLX']
             ),
+            *live_controls('close_price_3'),
             dcc.Graph(id='close_price_3')], style={'display': 'inline-block', 'width': '48%', 'height': '700'}),
         html.Div(children=[
             dcc.Dropdown(
             id='name_4',
             value='Netflix, Inc., NFLX',
             clearable=True,
-            options=names_symbols.index
+            options=['Netflix, Inc., NFLX']
             ),
+            *live_controls('close_price_4'),
             dcc.Graph(id='close_price_4')], style={'display': 'inline-block', 'width': '48%', 'height': '700'})]
-            )
+            ),
+    html.Div(className='row', children=[
+        html.H4('Comparison'),
+        dcc.Dropdown(
+            id='compare',
+            value=['Netflix, Inc., NFLX'],
+            multi=True,
+            clearable=True,
+            options=['Netflix, Inc., NFLX']
+        ),
+        dcc.Graph(id='compare_price')])
 ])
 
 
-@app.callback(Output('close_price_1', 'figure'), Input('name_1', 'value'))
-def price_hist_1(name_1):
-    close_figure = graph_callback_all_history(name_1, names_symbols, freq=None, short_term=SHORT_TERM, long_term=LONG_TERM)
-    close_figure.update_layout(height=700, yaxis=dict(autorange=True, fixedrange=False),
-                            xaxis=dict(
-                                rangeselector=dict(
-                                    buttons=list([
-                                        dict(count=1,
-                                             label="1m",
-                                             step="month",
-                                             stepmode="backward"),
-                                        dict(count=6,
-                                             label="6m",
-                                             step="month",
-                                             stepmode="backward"),
-                                        dict(count=1,
-                                             label="YTD",
-                                             step="year",
-                                             stepmode="todate"),
-                                        dict(count=1,
-                                             label="1y",
-                                             step="year",
-                                             stepmode="backward"),
-                                        dict(count=2,
-                                             label="2y",
-                                             step="year",
-                                             stepmode="backward"),
-                                        dict(count=5,
-                                             label="5y",
-                                             step="year",
-                                             stepmode="backward"),
-                                        dict(step="all")
-                                    ])
-                                ),
-                                rangeslider=dict(
-                                    visible=True
-                                ),
-                                type="date"
-                            )
-                            )
-    return close_figure
-
-
-@app.callback(Output('close_price_2', 'figure'), Input('name_2', 'value'))
-def price_hist_2(name_2):
-    close_figure = graph_callback_all_history(name_2, names_symbols, freq=None, short_term=SHORT_TERM, long_term=LONG_TERM)
-    close_figure.update_layout(height=700, yaxis=dict(autorange=True, fixedrange=False),
-                            xaxis=dict(
-                                rangeselector=dict(
-                                    buttons=list([
-                                        dict(count=1,
-                                             label="1m",
-                                             step="month",
-                                             stepmode="backward"),
-                                        dict(count=6,
-                                             label="6m",
-                                             step="month",
-                                             stepmode="backward"),
-                                        dict(count=1,
-                                             label="YTD",
-                                             step="year",
-                                             stepmode="todate"),
-                                        dict(count=1,
-                                             label="1y",
-                                             step="year",
-                                             stepmode="backward"),
-                                        dict(count=2,
-                                             label="2y",
-                                             step="year",
-                                             stepmode="backward"),
-                                        dict(count=5,
-                                             label="5y",
-                                             step="year",
-                                             stepmode="backward"),
-                                        dict(step="all")
-                                    ])
-                                ),
-                                rangeslider=dict(
-                                    visible=True
-                                ),
-                                type="date"
-                            )
-                            )
-    return close_figure
-
-
-@app.callback(Output('close_price_3', 'figure'), Input('name_3', 'value'))
-def price_hist_3(name_3):
-    close_figure = graph_callback_high_freq(name_3,  names_symbols, freq='1min', short_term=SHORT_TERM, long_term=LONG_TERM)
-    close_figure.update_layout(height=700, yaxis=dict(autorange=True, fixedrange=False),
-                               xaxis=dict(
-                                   rangeselector=dict(
-                                       buttons=list([
-                                           dict(count=12,
-                                                label="1d",
-                                                step="hour",
-                                                stepmode="backward"),
-                                           dict(count=2,
-                                                label="2d",
-                                                step="day",
-                                                stepmode="backward"),
-                                           dict(count=1,
-                                                label="1d",
-                                                step="day",
-                                                stepmode="backward"),
-                                           dict(count=10,
-                                                label="2w",
-                                                step="day",
-                                                stepmode="backward"),
-                                           dict(step="all")
-                                       ])
-                                   ),
-                                   rangeslider=dict(
-                                       visible=True
-                                   ),
-                                   type="date"
-                               )
-                               )
-
-    return close_figure
-
-
-@app.callback(Output('close_price_4', 'figure'), Input('name_4', 'value'))
-def price_hist_4(name_4):
-    close_figure = graph_callback_high_freq(name_4,  names_symbols, freq='1min', short_term=SHORT_TERM, long_term=LONG_TERM)
-    close_figure.update_layout(height=700, yaxis=dict(autorange=True, fixedrange=False),
-                               xaxis=dict(
-                                   rangeselector=dict(
-                                       buttons=list([
-                                           dict(count=60,
-                                                label="1h",
-                                                step="minute",
-                                                stepmode="backward"),
-                                           dict(count=240,
-                                                label="4h",
-                                                step="minute",
-                                                stepmode="backward"),
-                                           dict(count=12,
-                                                label="1d",
-                                                step="hour",
-                                                stepmode="backward"),
-                                           dict(step="all")
-                                       ])
-                                   ),
-                                   rangeslider=dict(
-                                       visible=True
-                                   ),
-                                   type="date"
-                               )
-                               )
-
-    return close_figure
+# Dropdown options are served from the symbol index through search callbacks, instead of being sent with the layout.
+# The symbols are read on each call, so that a refreshed list is picked up.
+register_search_callbacks(app, ['name_1', 'name_2', 'name_3', 'name_4', 'compare'], get_symbol_index)
+# Moving averages of the history charts are computed in the browser, from closes sent once per ticker
+register_client_ma(app, 'close_price_1')
+register_client_ma(app, 'close_price_2')
+
+
+def intraday_figure(name, x_range, chart):
+    return graph_callback_high_freq(name, get_names_symbols(), freq='1min', short_term=SHORT_TERM, long_term=LONG_TERM,
+                                    x_range=x_range, chart=chart, webgl=WEBGL, template=TEMPLATE, encode=False)
+
+
+register_live_callbacks(app, 'close_price_3', 'name_3', short_term=SHORT_TERM, long_term=LONG_TERM, freq='1min',
+                        build=partial(intraday_figure, chart='multi_day'))
+register_live_callbacks(app, 'close_price_4', 'name_4', short_term=SHORT_TERM, long_term=LONG_TERM, freq='1min',
+                        build=partial(intraday_figure, chart='intraday_12h'))
+
+
+@app.callback(Output('close_price_1_close', 'data'), Output('close_price_2_close', 'data'),
+              Input('name_1', 'value'), Input('name_2', 'value'))
+def price_hist_1_2(name_1, name_2):
+    names_symbols = get_names_symbols()
+    # The histories of both panels are loaded in a single round trip, the closes are then read from the local store
+    get_prices_many([names_symbols.at[n, 'symbol'] for n in (name_1, name_2) if n in names_symbols.index])
+    closes = []
+    for dropdown_id, name in [('name_1', name_1), ('name_2', name_2)]:
+        # Only the panel whose ticker changed is sent again, both are on the first call
+        if ctx.triggered_id not in (None, dropdown_id):
+            closes.append(no_update)
+            continue
+        closes.append(close_data(name, names_symbols, chart='history', template=TEMPLATE, webgl=WEBGL))
+    return closes
+
+
+@app.callback(Output('compare_price', 'figure'), Input('compare', 'value'))
+def price_compare(names):
+    figure = compare_callback(names or [], get_names_symbols(), windows=[SHORT_TERM, LONG_TERM], webgl=WEBGL,
+                              template=TEMPLATE)
+    return no_update if figure is None else figure
+
+
+@app.callback(Output('close_price_3', 'figure'), Output('close_price_3_last_bar', 'data'), Input('name_3', 'value'),
+              Input('close_price_3', 'relayoutData'))
+def price_hist_3(name_3, relayout_3):
+    close_figure = intraday_figure(name_3, zoomed_range('close_price_3', relayout_3), chart='multi_day')
+    return close_figure, last_bar(close_figure)
+
+
+@app.callback(Output('close_price_4', 'figure'), Output('close_price_4_last_bar', 'data'), Input('name_4', 'value'),
+              Input('close_price_4', 'relayoutData'))
+def price_hist_4(name_4, relayout_4):
+    close_figure = intraday_figure(name_4, zoomed_range('close_price_4', relayout_4), chart='intraday_12h')
+    return close_figure, last_bar(close_figure)
 
 
 if __name__ == '__main__':
+    Prefetcher(symbols=['NFLX']).start()
     app.run_server(debug=True, port=8080)
@@ -0,0 +1,78 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+from dash import Input, Output, State
+from dash.exceptions import PreventUpdate
+
+# Number of options returned to a dropdown for each search
+SEARCH_LIMIT = 50
+
+
+class SymbolIndex:
+    # Word prefix index for one or two character queries, and trigram index for longer ones.
+    # Labels are the 'name, symbol' strings used as dropdown values.
+    def __init__(self, labels):
+        self.labels = [label for label in labels if isinstance(label, str)]
+        self._lower = [label.lower() for label in self.labels]
+        tokens = sorted((token, i) for i, label in enumerate(self._lower)
+                        for token in set(re.split(r'[\s,.()]+', label)) if token)
+        self._tokens = [token for token, _ in tokens]
+        self._token_ids = np.array([i for _, i in tokens], dtype=np.int32)
+        postings = defaultdict(list)
+        for i, label in enumerate(self._lower):
+            for trigram in {label[j:j + 3] for j in range(len(label) - 2)}:
+                postings[trigram].append(i)
+        self._trigrams = {trigram: np.array(ids, dtype=np.int32) for trigram, ids in postings.items()}
+
+    def _candidates(self, query):
+        if len(query) < 3:
+            lo = bisect_left(self._tokens, query)
+            hi = bisect_left(self._tokens, query + '\uffff')
+            return np.unique(self._token_ids[lo:hi])
+        postings = [self._trigrams.get(query[j:j + 3]) for j in range(len(query) - 2)]
+        if any(p is None for p in postings):
+            return []
+        postings.sort(key=len)
+        candidates = postings[0]
+        for p in postings[1:]:
+            candidates = np.intersect1d(candidates, p, assume_unique=True)
+        # Trigrams can all be present without the query being a substring
+        return [i for i in candidates if query in self._lower[i]]
+
+    def _rank(self, i, query):
+        label = self._lower[i]
+        if label.endswith(', ' + query):
+            return 0, len(label)
+        if label.startswith(query):
+            return 1, len(label)
+        if (' ' + query) in label:
+            return 2, len(label)
+        return 3, len(label)
+
+    def search(self, query: str, limit=SEARCH_LIMIT):
+        query = query.strip().lower()
+        if not query:
+            return []
+        candidates = sorted(self._candidates(query), key=lambda i: self._rank(i, query))
+        return [self.labels[i] for i in candidates[:limit]]
+
+    def options(self, search_value, value, limit=SEARCH_LIMIT):
+        if not search_value:
+            raise PreventUpdate
+        matches = self.search(search_value, limit)
+        # The selected values must stay among the options for the dropdown to display them
+        selected = value if isinstance(value, list) else [value] if value else []
+        return matches + [v for v in selected if v not in matches]
+
+
+def register_search_callbacks(app, dropdown_ids, get_index, limit=SEARCH_LIMIT):
+    # Dropdowns start with their default value only, and receive the matches as the user types.
+    # get_index() returns the SymbolIndex to search, read on each search so that a refreshed list is used.
+    for dropdown_id in dropdown_ids:
+        @app.callback(Output(dropdown_id, 'options'),
+                      Input(dropdown_id, 'search_value'),
+                      State(dropdown_id, 'value'))
+        def update_options(search_value, value):
+            return get_index().options(search_value, value, limit)
@@ -0,0 +1,139 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+from fmp_extractor.config import API_KEY
+
+from symbol_search import SymbolIndex
+
+# Raw list of tradable symbols as downloaded from the API
+SYMBOLS_PICKLE = 'list_tradable_symbols.pickle'
+# Compact copy with categorical columns and the precomputed dropdown index, rebuilt whenever the raw list changes
+COMPACT_PICKLE = 'list_tradable_symbols.compact.pickle'
+# Bump when the content of the compact copy changes
+COMPACT_VERSION = 1
+SYMBOLS_URL = 'https://financialmodelingprep.com/api/v3/available-traded/list?apikey={api_key}'
+CATEGORICAL_COLUMNS = ['exchange', 'exchangeShortName', 'type']
+# Seconds after which the list is downloaded again
+REFRESH_INTERVAL = 24 * 60 * 60
+# Seconds between two checks for a list refreshed by another process
+CHECK_INTERVAL = 60
+
+_lock = threading.Lock()
+_loaded = {}
+_refresh_thread = None
+
+
+def _compact(list_symbols):
+    list_symbols = list_symbols.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in list_symbols:
+            list_symbols[column] = list_symbols[column].astype('category')
+    # Interned strings are stored once in the pickle and shared in memory once loaded
+    for column in ['name', 'symbol']:
+        list_symbols[column] = list_symbols[column].map(lambda v: sys.intern(v) if isinstance(v, str) else v)
+    names_symbols = list_symbols.loc[:, ['name', 'symbol', 'exchange']]
+    names_symbols.loc[:, 'name_symbol'] = names_symbols.loc[:, 'name'] + ', ' + names_symbols.loc[:, 'symbol']
+    names_symbols.set_index('name_symbol', inplace=True)
+    return list_symbols, names_symbols
+
+
+def _load():
+    source_mtime = os.path.getmtime(SYMBOLS_PICKLE)
+    try:
+        compact = pd.read_pickle(COMPACT_PICKLE)
+        if compact['version'] == COMPACT_VERSION and compact['source_mtime'] == source_mtime:
+            return dict(list_symbols=compact['list_symbols'], names_symbols=compact['names_symbols'],
+                        source_mtime=source_mtime, checked=time.time())
+    except (FileNotFoundError, KeyError, EOFError):
+        pass
+    logging.warning(f'Rebuilding {COMPACT_PICKLE} from {SYMBOLS_PICKLE}')
+    list_symbols, names_symbols = _compact(pd.read_pickle(SYMBOLS_PICKLE))
+    tmp_path = f'{COMPACT_PICKLE}.{os.getpid()}.tmp'
+    pd.to_pickle({'version': COMPACT_VERSION, 'source_mtime': source_mtime,
+                  'list_symbols': list_symbols, 'names_symbols': names_symbols}, tmp_path)
+    os.replace(tmp_path, COMPACT_PICKLE)
+    return dict(list_symbols=list_symbols, names_symbols=names_symbols, source_mtime=source_mtime,
+                checked=time.time())
+
+
+def _changed(loaded):
+    # The list of the process is compared with the file at most every CHECK_INTERVAL seconds, so that a list
+    # refreshed by another worker is picked up
+    if time.time() - loaded['checked'] < CHECK_INTERVAL:
+        return False
+    loaded['checked'] = time.time()
+    return os.path.getmtime(SYMBOLS_PICKLE) != loaded['source_mtime']
+
+
+def _get(key):
+    # Loaded on first access rather than at import time, and again once the list was refreshed.
+    # A new list replaces the whole dict at once, so readers never see half of it.
+    global _loaded
+    loaded = _loaded
+    if not loaded or _changed(loaded):
+        with _lock:
+            if not _loaded or os.path.getmtime(SYMBOLS_PICKLE) != _loaded['source_mtime']:
+                _loaded = _load()
+            loaded = _loaded
+    if key == 'symbol_index' and key not in loaded:
+        # The search index is built on first use of each list
+        with _lock:
+            if key not in loaded:
+                loaded[key] = SymbolIndex(loaded['names_symbols'].index)
+    return loaded[key]
+
+
+def get_list_symbols():
+    return _get('list_symbols')
+
+
+def get_names_symbols():
+    return _get('names_symbols')
+
+
+def get_symbol_index():
+    # Search index of the dropdown labels of the current list
+    return _get('symbol_index')
+
+
+def get_exchanges():
+    return get_names_symbols().exchange.dropna().unique().tolist()
+
+
+def refresh():
+    list_symbols = pd.read_json(SYMBOLS_URL.format(api_key=API_KEY))
+    tmp_path = f'{SYMBOLS_PICKLE}.{os.getpid()}.tmp'
+    list_symbols.to_pickle(tmp_path)
+    os.replace(tmp_path, SYMBOLS_PICKLE)
+    global _loaded
+    loaded = _load()
+    with _lock:
+        _loaded = loaded
+    print('List updated')
+
+
+def refresh_if_stale(max_age=REFRESH_INTERVAL):
+    # Download the list again when it is older than max_age seconds, and return whether it was
+    if os.path.exists(SYMBOLS_PICKLE) and time.time() - os.path.getmtime(SYMBOLS_PICKLE) < max_age:
+        return False
+    refresh()
+    return True
+
+
+def start_refresh():
+    # Download the list in a background thread, the current one is served until the new one is ready
+    global _refresh_thread
+    with _lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return _refresh_thread
+        _refresh_thread = threading.Thread(target=refresh, name='symbols-refresh', daemon=True)
+        _refresh_thread.start()
+        return _refresh_thread
+
+
+if __name__ == '__main__':
+    refresh()
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Operators of the DataTable filter query language, the longer ones first so that '>=' wins over '>'
+OPERATORS = [['ge ', '>='],
+             ['le ', '<='],
+             ['lt ', '<'],
+             ['gt ', '>'],
+             ['ne ', '!='],
+             ['eq ', '='],
+             ['contains '],
+             ['datestartswith ']]
+
+
+def split_filter_part(filter_part: str):
+    # A filter part reads '{column} operator value', the operator is looked for right after the column name
+    name_end = filter_part.find('}')
+    name = filter_part[filter_part.find('{') + 1: name_end]
+    rest = filter_part[name_end + 1:].lstrip()
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if rest.startswith(operator):
+                value_part = rest[len(operator):].strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 == value_part[-1:] and v0 in ("'", '"', '`') and len(value_part) > 1:
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                elif operator_type[0] in ('contains ', 'datestartswith '):
+                    # Text operators match what was typed, '3' must not become '3.0'
+                    value = value_part
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                # Word operators need spaces after them in the filter string, but they don't in the comparison
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def _compare(column, operator, value):
+    if operator in ('eq', 'ne', 'lt', 'le', 'gt', 'ge'):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Categories are compared by value, unordered categoricals only support equality
+            column = column.astype(str)
+        if isinstance(value, float) and not pd.api.types.is_numeric_dtype(column):
+            column = pd.to_numeric(column, errors='coerce')
+        elif not isinstance(value, float) and pd.api.types.is_numeric_dtype(column):
+            column = column.astype(str)
+        try:
+            return getattr(column, operator)(value)
+        except TypeError:
+            # A comparison the column's type does not support, e.g. a date with text, matches nothing
+            return pd.Series(False, index=column.index)
+    if operator == 'contains':
+        return column.astype(str).str.contains(str(value), case=False, regex=False)
+    if operator == 'datestartswith':
+        return column.astype(str).str.startswith(str(value))
+    return pd.Series(True, index=column.index)
+
+
+def filter_frame(df, filter_query):
+    if not filter_query:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for filter_part in filter_query.split(' && '):
+        col_name, operator, filter_value = split_filter_part(filter_part)
+        if col_name not in df.columns:
+            continue
+        mask &= _compare(df[col_name], operator, filter_value).fillna(False).to_numpy(dtype=bool)
+    return df[mask]
+
+
+def sort_frame(df, sort_by):
+    if not sort_by:
+        return df
+    sort_by = [s for s in sort_by if s['column_id'] in df.columns]
+    if not sort_by:
+        return df
+    return df.sort_values([s['column_id'] for s in sort_by],
+                          ascending=[s['direction'] == 'asc' for s in sort_by],
+                          na_position='last', kind='stable')
+
+
+def page_frame(df, page_current, page_size):
+    start = page_current * page_size
+    return df.iloc[start:start + page_size]
+
+
+def query_frame(df, page_current, page_size, sort_by=None, filter_query=None, columns=None):
+    """
+    Apply a DataTable filter query and sort order to df and return the records of the requested page,
+    together with the resulting number of pages.
+    """
+    df = sort_frame(filter_frame(df, filter_query), sort_by)
+    page_count = max(int(np.ceil(len(df) / page_size)), 1)
+    # The page on display may not exist anymore after a new filter or exchange
+    page = page_frame(df, min(page_current, page_count - 1), page_size)
+    if columns is not None:
+        page = page.loc[:, [c for c in columns if c in page.columns]]
+    page = page.copy()
+    # float32 values are sent with their own shortest representation, not the one of the float64 they convert to
+    for column in page.columns[page.dtypes == np.float32]:
+        page[column] = page[column].astype(str).astype(float)
+    return page.to_dict('records'), page_count
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_provider  # noqa: E402
+
+# The apps' modules import fmp_extractor, they are served by the fake provider in the tests
+provider = fake_provider.FakeProvider(history_years=2, intraday_days=2)
+fake_provider.install(provider)
+EXCHANGE_SIZES = {'EXA': 700, 'EXB': 20}
+
+
+@pytest.fixture(scope='session', autouse=True)
+def workdir(tmp_path_factory):
+    # Price store, caches and symbol list of the tests live in a scratch directory
+    path = tmp_path_factory.mktemp('work')
+    cwd = os.getcwd()
+    os.chdir(path)
+    fake_provider.listing(EXCHANGE_SIZES).to_pickle('list_tradable_symbols.pickle')
+    from client import client, TokenBucket
+    # The provider's rate limit would only slow the tests down
+    client.bucket = TokenBucket(rate=1e9, capacity=1e9)
+    yield path
+    os.chdir(cwd)
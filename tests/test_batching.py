@@ -0,0 +1,111 @@
+import random
+import time
+import urllib.error
+import urllib.parse
+
+import pandas as pd
+import pytest
+
+from batching import fetch_batches, plan_batches, safe_batch_size, save_batch_size, load_batch_size
+
+
+def http_error(code):
+    return urllib.error.HTTPError('https://example.com', code, 'error', {}, None)
+
+
+def url_bytes(batch, base_bytes):
+    return base_bytes + len(','.join(urllib.parse.quote(s, safe='') for s in batch))
+
+
+@pytest.mark.parametrize('max_batch_size', [None, 7])
+def test_plan_batches_fit_and_keep_order(max_batch_size):
+    symbols = [f'S{i}' + '^' * (i % 3) for i in range(500)]
+    batches = plan_batches(symbols, base_bytes=100, max_url_bytes=400, max_batch_size=max_batch_size)
+    assert [s for b in batches for s in b] == symbols
+    assert all(url_bytes(b, 100) <= 400 for b in batches)
+    if max_batch_size is not None:
+        assert all(len(b) <= max_batch_size for b in batches)
+    # Batches are packed: adding the next symbol to a batch would not fit
+    for batch, following in zip(batches, batches[1:]):
+        assert url_bytes(batch + following[:1], 100) > 400 or len(batch) == max_batch_size
+
+
+def test_plan_batches_empty():
+    assert plan_batches([], base_bytes=100) == []
+
+
+def test_fetch_batches_keeps_order():
+    batches = [list(range(i * 10, i * 10 + 10)) for i in range(20)]
+
+    def fetch(batch):
+        time.sleep(random.uniform(0, 0.01))
+        return batch[0]
+
+    assert fetch_batches(batches, fetch, max_in_flight=8) == [b[0] for b in batches]
+
+
+def test_fetch_batches_retries_transient_errors():
+    calls = []
+
+    def fetch(batch):
+        calls.append(batch)
+        if len(calls) < 3:
+            raise http_error(503)
+        return 'ok'
+
+    assert fetch_batches([['A']], fetch, retries=3, backoff=0) == ['ok']
+    assert len(calls) == 3
+
+
+def test_fetch_batches_raises_after_retries():
+    def fetch(batch):
+        raise http_error(503)
+
+    with pytest.raises(urllib.error.HTTPError):
+        fetch_batches([['A']], fetch, retries=2, backoff=0)
+
+
+def test_fetch_batches_splits_too_long_batches():
+    def fetch(batch):
+        if len(batch) > 3:
+            raise http_error(414)
+        return batch
+
+    stats = {}
+    batches = [list('ABCDEFGHIJ'), list('KL')]
+    frames = fetch_batches(batches, fetch, retries=0, stats=stats)
+    assert [s for f in frames for s in f] == list('ABCDEFGHIJKL')
+    assert all(len(f) <= 3 for f in frames)
+    assert min(stats['failed']) > 3 and max(stats['succeeded']) <= 3
+    assert safe_batch_size(stats) == 3
+
+
+def test_fetch_batches_does_not_split_other_errors():
+    calls = []
+
+    def fetch(batch):
+        calls.append(batch)
+        raise http_error(401)
+
+    stats = {}
+    with pytest.raises(urllib.error.HTTPError):
+        fetch_batches([list('ABCDEFGH')], fetch, retries=3, backoff=0, stats=stats)
+    assert len(calls) == 1 and stats['failed'] == []
+
+
+def test_batch_sizes_are_kept(tmp_path):
+    path = str(tmp_path / 'batch_sizes.json')
+    assert load_batch_size('EXA', default=1500, path=path) == 1500
+    save_batch_size('EXA', 300, path=path)
+    assert load_batch_size('EXA', default=1500, path=path) == 300
+
+
+def test_get_all_quotes_with_fake_provider():
+    import aux
+    import symbols
+
+    quotes = aux.get_all_quotes('EXA')
+    list_symbols = symbols.get_list_symbols()
+    expected = list_symbols.loc[list_symbols.exchange == 'EXA', 'symbol'].tolist()
+    assert quotes['symbol'].tolist() == expected
+    assert isinstance(quotes, pd.DataFrame)
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from client import ProviderClient, TokenBucket
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(10)]
+    elapsed = time.monotonic() - start
+    # The burst goes through at once, the next five wait for the rate
+    assert all(w < 0.01 for w in waits[:5])
+    assert elapsed >= 5 / 50 * 0.9
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def call_concurrently(client, func, n, *args):
+    results, threads = [None] * n, []
+    for i in range(n):
+        def run(i=i):
+            try:
+                results[i] = client.call(func, *args)
+            except Exception as error:
+                results[i] = error
+        threads.append(threading.Thread(target=run))
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_identical_calls_in_flight_are_coalesced():
+    client = ProviderClient(rate=1e9, burst=1e9)
+    release, calls = threading.Event(), []
+
+    def fetch(tickers):
+        calls.append(tickers)
+        release.wait(5)
+        return ','.join(tickers)
+
+    threads, results = call_concurrently(client, fetch, 4, ['A', 'B'])
+    wait_for(lambda: client.stats()['coalesced'] == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['A,B'] * 4
+    assert len(calls) == 1
+    assert client.stats()['requests'] == 1
+
+
+def test_errors_reach_coalesced_callers():
+    client = ProviderClient(rate=1e9, burst=1e9)
+    release = threading.Event()
+
+    def fetch(ticker):
+        release.wait(5)
+        raise KeyError(ticker)
+
+    threads, results = call_concurrently(client, fetch, 3, 'A')
+    wait_for(lambda: client.stats()['coalesced'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(r, KeyError) for r in results)
+    assert client.stats()['errors'] == 1
+
+
+def test_calls_after_completion_are_sent_again():
+    client = ProviderClient(rate=1e9, burst=1e9)
+    calls = []
+    for _ in range(2):
+        client.call(lambda ticker: calls.append(ticker), 'A')
+    assert calls == ['A', 'A']
+
+
+def test_different_arguments_are_not_coalesced():
+    from conftest import provider
+
+    client = ProviderClient(rate=1e9, burst=1e9)
+    calls = provider.calls
+    first = client.call(provider.extract_prices_history, ['HIS00000'])
+    second = client.call(provider.extract_prices_history, ['HIS00001'])
+    assert provider.calls == calls + 2
+    assert set(first.symbol) == {'HIS00000'} and set(second.symbol) == {'HIS00001'}
+
+
+@pytest.mark.parametrize('args', [(['A', 'B'],), ({'a': [1, 2]},)])
+def test_unhashable_arguments(args):
+    client = ProviderClient(rate=1e9, burst=1e9)
+    assert client.call(lambda value: value, *args) == args[0]
@@ -0,0 +1,74 @@
+import numpy as np
+
+import figures
+import single_stock_overview
+from aux import graph_callback_high_freq
+from conftest import provider
+from symbols import get_names_symbols
+
+
+def test_live_charts_are_sent_as_plain_arrays():
+    # The live updates append to the traces in the browser, which plotly cannot do with typed arrays
+    name = get_names_symbols().index[0]
+    assert figures.ENCODE_ARRAYS
+    encoded = graph_callback_high_freq(name, get_names_symbols(), freq='1min', short_term=30, long_term=200)
+    assert all(isinstance(trace['y'], dict) for trace in encoded['data'])
+    figure = single_stock_overview.intraday_figure(name, None)
+    assert all(isinstance(trace['y'], np.ndarray) for trace in figure['data'])
+
+
+def live_update(app, name, after):
+    # Response of the live callback of close_price_3, for a chart whose last bar is after
+    output = next(key for key in app.callback_map if key.startswith('..close_price_3.extendData'))
+    suffix = output.split('@')[1].split('.')[0]
+    body = {'output': output,
+            'outputs': [{'id': 'close_price_3', 'property': 'extendData'},
+                        {'id': 'close_price_3', 'property': f'figure@{suffix}'},
+                        {'id': 'close_price_3_last_bar', 'property': f'data@{suffix}'}],
+            'inputs': [{'id': 'close_price_3_interval', 'property': 'n_intervals', 'value': 1}],
+            'state': [{'id': 'name_3', 'property': 'value', 'value': name},
+                      {'id': 'close_price_3_last_bar', 'property': 'data', 'value': after},
+                      {'id': 'close_price_3', 'property': 'relayoutData', 'value': None}],
+            'changedPropIds': ['close_price_3_interval.n_intervals']}
+    response = app.server.test_client().post('/_dash-update-component', json=body)
+    assert response.status_code == 200
+    return response.get_json()['response']
+
+
+def shown_until(figure, n):
+    # Last bar of the figure with its last n points not shown yet
+    return dict(date=str(figure['data'][0]['x'][-1 - n])[:19].replace('T', ' '), freq=figure['layout']['meta']['freq'])
+
+
+def test_bars_at_the_base_frequency_are_appended():
+    name = get_names_symbols().index[1]
+    figure = single_stock_overview.intraday_figure(name, None)
+    assert figure['layout']['meta']['freq'] == '1min'
+    response = live_update(single_stock_overview.app, name, shown_until(figure, 2))
+    assert 'figure' not in response['close_price_3']
+    extend, traces, _ = response['close_price_3']['extendData']
+    assert traces == list(range(len(figure['data'])))
+    assert extend['y'][0] == figure['data'][0]['y'][-2:].tolist()
+
+
+def test_filling_bar_of_a_coarser_level_is_replaced(monkeypatch):
+    # Enough days of bars for the chart to show them at a coarser level
+    monkeypatch.setattr(provider, 'intraday_days', 10)
+    name = get_names_symbols().index[2]
+    figure = single_stock_overview.intraday_figure(name, None)
+    assert figure['layout']['meta']['freq'] != '1min'
+    response = live_update(single_stock_overview.app, name, shown_until(figure, 2))
+    operations = response['close_price_3']['figure']['operations']
+    assert [(o['operation'], o['location']) for o in operations[:4]] == [
+        ('Assign', ['data', 0, 'x', -1]), ('Assign', ['data', 0, 'y', -1]),
+        ('Extend', ['data', 0, 'x']), ('Extend', ['data', 0, 'y'])]
+    y = figure['data'][0]['y']
+    assert [operations[1]['params']['value']] + operations[3]['params']['value'] == y[-3:].tolist()
+    assert response['close_price_3_last_bar']['data'] == shown_until(figure, 0)
+
+
+def test_chart_is_rebuilt_when_the_level_changes():
+    name = get_names_symbols().index[1]
+    figure = single_stock_overview.intraday_figure(name, None)
+    response = live_update(single_stock_overview.app, name, dict(shown_until(figure, 0), freq='5min'))
+    assert response['close_price_3']['figure']['layout']['meta'] == {'freq': '1min'}
@@ -0,0 +1,38 @@
+import pytest
+
+import client
+import news_feed
+from conftest import provider
+from prefetch import Prefetcher
+
+
+@pytest.fixture
+def busy_news(monkeypatch):
+    # Every article of a merged call goes to the first ticker
+    def extract_top_news(tickers, limit=50):
+        return provider.extract_top_news(tickers[:1], limit)
+    monkeypatch.setattr(client, 'extract_top_news', extract_top_news)
+    monkeypatch.setattr(news_feed, 'news_cache', news_feed.SnapshotCache('news', ttl=60, max_entries=64,
+                                                                         cache_dir=None))
+
+
+def test_fetch_news_asks_left_out_tickers_alone(busy_news):
+    stats = {}
+    news = news_feed.fetch_news(['EXA00000', 'EXA00001', 'EXA00002'], limit=5, stats=stats)
+    assert {t: len(r) for t, r in news.items()} == {'EXA00000': 5, 'EXA00001': 5, 'EXA00002': 5}
+    assert stats['requests'] == 3
+
+
+def test_fetch_news_leaves_out_tickers_over_the_cap(busy_news):
+    news = news_feed.fetch_news(['EXA00000', 'EXA00001', 'EXA00002'], limit=5, max_requests=2)
+    assert sorted(news) == ['EXA00000', 'EXA00001']
+
+
+@pytest.mark.parametrize('budget', [3, 11, 25])
+def test_prefetcher_respects_the_budget(busy_news, budget):
+    # Tickers without a stored history, each one costs a request
+    tickers = [f'NEW{budget:02d}{i:03d}' for i in range(10)]
+    calls = provider.calls
+    left = Prefetcher(symbols=tickers, budget=budget).warm_symbols(budget)
+    assert provider.calls - calls <= budget
+    assert 0 <= left <= budget - (provider.calls - calls)
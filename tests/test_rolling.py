@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rolling import RollingMeans, rolling_means_frame
+
+WINDOWS = [15, 50]
+
+
+def closes(n=400, freq='B', seed=0):
+    rng = np.random.default_rng(seed)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    values[rng.choice(n, n // 20, replace=False)] = np.nan
+    return pd.Series(values, index=pd.date_range('2022-01-03', periods=n, freq=freq), name='close')
+
+
+def expected(close, windows):
+    return pd.DataFrame({f'{w}d-MA': close.rolling(f'{w}D').mean() for w in windows})
+
+
+@pytest.mark.parametrize('freq', ['B', 'D', 'h'])
+def test_means_match_pandas(freq):
+    close = closes(freq=freq)
+    means = RollingMeans().means('A', close, WINDOWS)
+    pd.testing.assert_frame_equal(means, expected(close, WINDOWS), check_names=False)
+
+
+def test_appended_bars_match_pandas():
+    close = closes()
+    rolling = RollingMeans()
+    rolling.means('A', close.iloc[:300], WINDOWS)
+    state = rolling._states[('A', tuple(WINDOWS))]
+    means = rolling.means('A', close, WINDOWS)
+    # The running sums of the first 300 bars were extended, not rebuilt
+    assert rolling._states[('A', tuple(WINDOWS))] is state
+    pd.testing.assert_frame_equal(means, expected(close, WINDOWS), check_names=False)
+
+
+def test_changed_bars_are_recomputed():
+    close = closes()
+    rolling = RollingMeans()
+    rolling.means('A', close, WINDOWS)
+    changed = close.copy()
+    changed.iloc[-1] = changed.iloc[-1] * 2
+    pd.testing.assert_frame_equal(rolling.means('A', changed, WINDOWS), expected(changed, WINDOWS),
+                                  check_names=False)
+
+
+def test_series_are_evicted():
+    rolling = RollingMeans(max_series=2)
+    for key in 'ABC':
+        rolling.means(key, closes(50), WINDOWS)
+    assert [k for k, _ in rolling._states] == ['B', 'C']
+
+
+def test_frame_means_match_pandas():
+    frame = pd.concat({f'S{i}': closes(seed=i) for i in range(5)}, axis=1)
+    means = rolling_means_frame(frame, WINDOWS)
+    for w in WINDOWS:
+        pd.testing.assert_frame_equal(means[f'{w}d-MA'], frame.rolling(f'{w}D').mean(), check_names=False)
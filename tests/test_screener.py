@@ -0,0 +1,59 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import screener
+
+
+def closes(n, symbols=('A', 'B')):
+    rng = np.random.default_rng(0)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (n, len(symbols))), axis=0))
+    return pd.DataFrame(values, index=pd.bdate_range('2023-01-02', periods=n), columns=list(symbols))
+
+
+def test_screen_matches_pandas():
+    close = closes(300)
+    result = screener.screen(close, 30, 200)
+    for symbol in close:
+        assert result.at[symbol, 'longMA'] == pytest.approx(close[symbol].rolling('200D').mean().iloc[-1])
+        assert result.at[symbol, 'price_to_shortMApercent'] == pytest.approx(
+            (close[symbol].iloc[-1] / close[symbol].rolling('30D').mean().iloc[-1] - 1) * 100)
+
+
+@pytest.mark.parametrize('n', [0, 1])
+def test_screen_without_history(n):
+    result = screener.screen(closes(n), 30, 200)
+    assert result.index.tolist() == ['A', 'B']
+    assert (result['maCross'] == '').all()
+
+
+def wait_for_builds():
+    deadline = time.monotonic() + 5
+    while screener._building:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_failed_screen_is_not_rebuilt(monkeypatch):
+    calls = []
+
+    def fail(*key):
+        calls.append(key)
+        raise ValueError('no history')
+
+    monkeypatch.setattr(screener, '_exchange_screen', fail)
+    assert screener.get_exchange_screen('FAIL', 30, 200) is None
+    wait_for_builds()
+    assert isinstance(screener.screen_error('FAIL', 30, 200), ValueError)
+    assert screener.get_exchange_screen('FAIL', 30, 200) is None
+    wait_for_builds()
+    assert len(calls) == 1
+
+    # Tried again once SCREEN_RETRY has passed
+    monkeypatch.setattr(screener, 'SCREEN_RETRY', 0)
+    assert screener.screen_error('FAIL', 30, 200) is None
+    screener.get_exchange_screen('FAIL', 30, 200)
+    wait_for_builds()
+    assert len(calls) == 2
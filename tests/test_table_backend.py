@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from table_backend import filter_frame, query_frame, split_filter_part
+
+QUOTES = pd.DataFrame({
+    'symbol': ['A3', 'B', 'C30', "D'E"],
+    'price': np.array([3., 40., 12.5, 7.], dtype=np.float32),
+    'earningsAnnouncement': pd.to_datetime(['2024-07-25', '2024-08-01', '2024-07-30', None]),
+    'exchange': pd.Categorical(['X', 'X', 'Y', 'Y']),
+})
+
+
+@pytest.mark.parametrize('filter_part, expected', [
+    ('{price} > 10', ('price', 'gt', 10.)),
+    ('{price} >= 10', ('price', 'ge', 10.)),
+    ('{symbol} contains 3', ('symbol', 'contains', '3')),
+    ('{symbol} = "B"', ('symbol', 'eq', 'B')),
+    ("{symbol} = 'D\\'E'", ('symbol', 'eq', "D'E")),
+    ('{earningsAnnouncement} datestartswith 2024-07', ('earningsAnnouncement', 'datestartswith', '2024-07')),
+])
+def test_split_filter_part(filter_part, expected):
+    assert split_filter_part(filter_part) == expected
+
+
+@pytest.mark.parametrize('filter_query, symbols', [
+    ('', ['A3', 'B', 'C30', "D'E"]),
+    ('{price} > 10', ['B', 'C30']),
+    ('{price} <= 7', ['A3', "D'E"]),
+    ('{price} = 12.5', ['C30']),
+    ('{symbol} contains 3', ['A3', 'C30']),
+    ('{symbol} contains c', ['C30']),
+    ('{symbol} = B', ['B']),
+    ('{exchange} = Y && {price} < 10', ["D'E"]),
+    ('{exchange} > X', ['C30', "D'E"]),
+    ('{exchange} >= x', []),
+    ('{earningsAnnouncement} > abc', []),
+    ('{earningsAnnouncement} datestartswith 2024-07', ['A3', 'C30']),
+    ('{unknown} > 1', ['A3', 'B', 'C30', "D'E"]),
+])
+def test_filter_frame(filter_query, symbols):
+    assert filter_frame(QUOTES, filter_query)['symbol'].tolist() == symbols
+
+
+def test_query_frame_sorts_pages_and_selects_columns():
+    data, page_count = query_frame(QUOTES, 1, 3, sort_by=[{'column_id': 'price', 'direction': 'desc'}],
+                                   columns=['symbol', 'price'])
+    assert page_count == 2
+    assert data == [{'symbol': 'A3', 'price': 3.0}]
+
+
+def test_query_frame_clamps_the_page():
+    # The page on display may be past the end once a filter is applied
+    data, page_count = query_frame(QUOTES, 5, 3, filter_query='{price} > 10')
+    assert page_count == 1
+    assert [r['symbol'] for r in data] == ['B', 'C30']
+
+
+def test_query_frame_sends_float32_as_typed():
+    data, _ = query_frame(pd.DataFrame({'pe': np.array([12.3], dtype=np.float32)}), 0, 10)
+    assert data == [{'pe': 12.3}]
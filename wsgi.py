@@ -0,0 +1,79 @@
+"""
+Production entry point serving the three apps from one WSGI host:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Apps, symbol universe and reference data are loaded in the master process before the workers are forked, so that
+the workers share them copy-on-write. Caches are stored in DASH_CACHE_DIR, shared by every worker.
+"""
+import fcntl
+import gc
+import importlib
+import os
+import threading
+
+# Set before the apps' modules are imported, the caches choose their backend at import time
+os.environ.setdefault('DASH_CACHE_DIR', 'dash_cache')
+
+import flask
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+
+import symbols
+from prefetch import Prefetcher
+
+# URL prefix of each app's module
+APPS = {'/markets': 'all_markets', '/stock': 'single_stock_overview', '/display': 'stock_display'}
+# Only one worker at a time warms the shared caches, the one holding this lock
+PREFETCH_LOCK = os.path.join(os.environ['DASH_CACHE_DIR'], 'prefetch.lock')
+PREFETCH_SYMBOLS = ['NFLX']
+PREFETCH_EXCHANGES = ['XETRA']
+
+
+def _load_app(module_name: str, prefix: str):
+    # The browser sends its requests under the prefix, Dash reads it from the environment when the app is created
+    os.environ['DASH_REQUESTS_PATHNAME_PREFIX'] = f'{prefix}/'
+    try:
+        return importlib.import_module(module_name).app
+    finally:
+        del os.environ['DASH_REQUESTS_PATHNAME_PREFIX']
+
+
+def _index():
+    index = flask.Flask(__name__)
+
+    @index.route('/')
+    def links():
+        return ''.join(f'<p><a href="{prefix}/">{module_name}</a></p>' for prefix, module_name in APPS.items())
+    return index
+
+
+# Loaded on first access otherwise, in every worker
+symbols.get_list_symbols()
+symbols.get_names_symbols()
+symbols.get_symbol_index()
+dash_apps = {prefix: _load_app(module_name, prefix) for prefix, module_name in APPS.items()}
+application = DispatcherMiddleware(_index(), {prefix: app.server for prefix, app in dash_apps.items()})
+# Objects loaded so far are never collected, so the garbage collector does not write to their shared pages
+gc.freeze()
+
+
+def start_prefetcher():
+    """
+    Called in every worker after the fork: the first worker to take the lock runs the Prefetcher, and another one
+    takes over if it exits. Threads do not survive a fork, so it cannot be started in the master.
+    """
+    os.makedirs(os.path.dirname(PREFETCH_LOCK), exist_ok=True)
+    lock_file = open(PREFETCH_LOCK, 'w')
+
+    def wait_for_lock():
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        Prefetcher(symbols=PREFETCH_SYMBOLS, exchanges=PREFETCH_EXCHANGES).start()
+
+    threading.Thread(target=wait_for_lock, name='prefetch-lock', daemon=True).start()
+
+
+if __name__ == '__main__':
+    # Without gunicorn: one forked process per request, sharing the preloaded data
+    from werkzeug.serving import run_simple
+    start_prefetcher()
+    run_simple('0.0.0.0', 8000, application, processes=os.cpu_count())